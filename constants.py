@@ -1,2 +1,5 @@
 HF_REPO_ID = "WFRaain/TAG_datasets"
 ROOT = "./TAGDataset"
+# Version of saved link splits. Increase it whenever a split function changes how splits or negative samples are
+# generated, such that splits saved by the previous algorithm are not reused.
+LINK_SPLIT_VERSION = 2
@@ -1,3 +1,5 @@
 from .data import TAGData
 from .dataset import TAGDataset
 from .base import BaseDict
+from .text_array import TextArray
+from .task_store import PackedTaskStore
@@ -7,19 +7,20 @@ from torch import Tensor, LongTensor
 from torch_geometric.data import Data
 
 from .base import DictFunctions
+from .text_array import TextArray
 
 
 class TAGData(Data, DictFunctions):
     r"""
     Data object for saving and processing Text-Attributed Graphs (TAGs) data and related information.
-    It inherits from :class:`torch_geometric.data and extend it to support np.ndarray and list input of node and edge text features.
+    It inherits from :class:`torch_geometric.data and extend it to support np.ndarray, list and :class:`TextArray` input of node and edge text features.
     Args:
-        x (Union[list[str], np.ndarray, Tensor], optional): The node feature input to the model. Default arg for saving node text.
+        x (Union[list[str], np.ndarray, TextArray, Tensor], optional): The node feature input to the model. Default arg for saving node text.
         node_map (LongTensor, optional): Mapping from nodes in graph to features.
         edge_index (LongTensor, optional): Graph connectivity in COO format with shape :obj:`[2, num_edges]`. (default: :obj:`None`).
         edge_map (LongTensor, optional): Mapping from edges in graph to edge feature.
-        edge_attr (Union[list[str], np.ndarray, Tensor], optional):  The edge feature input to the model. Default arg for saving edge text.
-        label (Union[list[str], np.ndarray, Tensor], optional): Store text label set for the graph,
+        edge_attr (Union[list[str], np.ndarray, TextArray, Tensor], optional):  The edge feature input to the model. Default arg for saving edge text.
+        label (Union[list[str], np.ndarray, TextArray, Tensor], optional): Store text label set for the graph,
                                 could be either node-level, edge-level or graph-level label.
         label_map (LongTensor, optional): Mapping from label of the graph to label feature.
         x_original (Tensor, optional): Original node features (features used in original dataset).
@@ -27,12 +28,12 @@ class TAGData(Data, DictFunctions):
     """
 
     def __init__(self,
-                 x: Optional[Union[list[str], np.ndarray]] = None,
+                 x: Optional[Union[list[str], np.ndarray, TextArray]] = None,
                  node_map: Optional[LongTensor] = None,
                  edge_index: Optional[LongTensor] = None,
                  edge_map: Optional[LongTensor] = None,
-                 edge_attr: Optional[Union[list[str], np.ndarray, Tensor]] = None,
-                 label: Optional[Union[list[str], np.ndarray, Tensor]] = None,
+                 edge_attr: Optional[Union[list[str], np.ndarray, TextArray, Tensor]] = None,
+                 label: Optional[Union[list[str], np.ndarray, TextArray, Tensor]] = None,
                  label_map: Optional[LongTensor] = None,
                  x_original: Optional[Tensor] = None,
                  edge_attr_original: Optional[Tensor] = None,
@@ -84,6 +85,8 @@ class TAGData(Data, DictFunctions):
     def __check_is_text__(self, content: Any) -> bool:
         if isinstance(content, str) or isinstance(content, np.str_):
             return True
+        elif isinstance(content, TextArray):
+            return True
         elif isinstance(content, list):
             if len(content) == 0:
                 return False
@@ -120,13 +123,41 @@ class TAGData(Data, DictFunctions):
         else:
             return input_texts
 
-    def text_input_to_list(self) -> Any:
+    def text_input_to_text_array(self) -> Any:
+        r"""Pack all text related input to :class:`TextArray`.
+        The text related input are specified in :attr:`text_keys`.
+        """
+        exist_keys = [key for key in self._store.keys() if key in self._text_keys]
+        for key in exist_keys:
+            setattr(self, key, self.__text_to_text_array__(getattr(self, key)))
+
+        return self
+
+    def __text_to_text_array__(
+            self,
+            input_texts: Union[str, int, float, list[str], np.ndarray, TextArray]) -> Union[TextArray, Any]:
+        """
+        Convert 1-d text input to TextArray. Nested or multi-dimensional input is kept as it is.
+        """
+        input_texts = self.__text_to_list__(input_texts)
+        if isinstance(input_texts, list) and all(isinstance(t, str) for t in input_texts):
+            return TextArray.from_list(input_texts)
+        else:
+            return input_texts
+
+    def text_input_to_list(self, keep_text_array: bool = False) -> Any:
         r"""Unify all text related input to list.
         The text related input are specified in :attr:`text_keys`.
+        Args:
+            keep_text_array (bool, optional): If true, text input stored as :class:`TextArray` is kept as it is,
+                such that only the indexed texts are decoded later.
         """
         exist_keys = [key for key in self._store.keys() if key in self._text_keys]
         for key in exist_keys:
-            setattr(self, key, self.__text_to_list__(getattr(self, key)))
+            value = getattr(self, key)
+            if keep_text_array and isinstance(value, TextArray):
+                continue
+            setattr(self, key, self.__text_to_list__(value))
 
         return self
 
@@ -144,7 +175,7 @@ class TAGData(Data, DictFunctions):
             return [str(input_texts)]
         elif isinstance(input_texts, list):
             return input_texts
-        elif isinstance(input_texts, np.ndarray):
+        elif isinstance(input_texts, (np.ndarray, TextArray)):
             return input_texts.tolist()
         # elif isinstance(input_texts, dict) or isinstance(input_texts, UserDict):
         #     for key, value in input_texts.items():
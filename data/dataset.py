@@ -1,4 +1,7 @@
+import hashlib
 import os.path as osp
+import shutil
+from collections import UserDict
 from abc import ABC, abstractmethod
 from typing import (
     Optional,
@@ -11,8 +14,10 @@ import torch
 from torch import Tensor
 from torch_geometric.data import InMemoryDataset
 
-from TAGLAS.constants import ROOT
+from TAGLAS.constants import ROOT, LINK_SPLIT_VERSION
+from TAGLAS.utils.io import save_columnar, load_or_save_columnar
 from .data import TAGData
+from .text_array import TextArray, is_text_collection
 from copy import deepcopy as c
 import numpy as np
 
@@ -26,6 +31,9 @@ class TAGDataset(InMemoryDataset, ABC):
         transform (callable, optional): A Callable class to transform dataset after process.
         pre_transform (callable, optional): A Callable class to transform data before process.
         pre_filter (callable, optional): A Callable class to filter out sample in dataset.
+        load_text (str, optional): How text features are loaded, choose from ("eager", "lazy"). If "eager", all texts
+            are decoded to list when loading the dataset. If "lazy", packed texts are kept memory-mapped and only
+            the texts that are actually indexed are decoded.
         kwargs: Other arguments.
     """
 
@@ -36,16 +44,66 @@ class TAGDataset(InMemoryDataset, ABC):
             transform: Optional[Callable] = None,
             pre_transform: Optional[Callable] = None,
             pre_filter: Optional[Callable] = None,
+            load_text: str = "eager",
             **kwargs) -> None:
         self.name = name
+        self.load_text = load_text
         root = (root if root is not None else ROOT)
         root = osp.join(root, self.name)
         super().__init__(root, transform, pre_transform, pre_filter)
-        self.data, self.slices = torch.load(self.processed_paths[0])
-        self.data = self._data.text_input_to_list()
-        self.side_data = torch.load(self.processed_paths[1])
+        self.data, self.slices = self._load_processed(self.processed_paths[0])
+        self.data = self._data.text_input_to_list(keep_text_array=self.lazy_text)
+        self.side_data = self._load_processed(self.processed_paths[1])
+
+    @property
+    def load_text(self) -> str:
+        return self._load_text
+
+    @load_text.setter
+    def load_text(self, value: str):
+        if value not in ["eager", "lazy"]:
+            raise ValueError(f"load_text should be chosen from (eager, lazy), got {value}.")
+        self._load_text = value
+
+    @property
+    def lazy_text(self) -> bool:
+        r"""Return true if packed text features should be kept without decoding."""
+        return getattr(self, "_load_text", "eager") == "lazy"
+
+    def _load_processed(self, path: str) -> Any:
+        r"""Load a processed file with all tensors memory-mapped. Processed files saved in the old pickled format
+        are converted to the columnar format the first time they are loaded. The conversion is done by one process
+        under a file lock and the converted file replaces the old one atomically.
+        Args:
+            path (str): Path of the processed file.
+        """
+        return load_or_save_columnar(path, lambda: torch.load(path))
+
+    def load_link_split(self, split_func: Callable, regenerate_split: bool = False, **kwargs) -> Any:
+        r"""Load link split generated by split_func from the processed directory. The split is generated and saved
+        in the columnar format the first time (or if regenerate_split is true) and memory-mapped in later loads.
+        Saved splits are keyed by LINK_SPLIT_VERSION, the name of split_func, all non-tensor arguments in kwargs and
+        the fingerprint of all tensor arguments (like edge_index and labels).
+        Args:
+            split_func (Callable): Function to generate link split, like :func:`generate_link_split`.
+            regenerate_split (bool, optional): If true, regenerate the split and overwrite the saved one. Saved PageRank
+            scores and top-k PPR neighbors derived from the split are removed.
+            kwargs: Arguments for split_func.
+        """
+        key = "_".join([f"v{LINK_SPLIT_VERSION}", split_func.__name__] +
+                       [f"{k}={tensor_fingerprint(v) if isinstance(v, Tensor) else v}"
+                        for k, v in sorted(kwargs.items())])
+        path = osp.join(self.processed_dir, "link_split", f"{key}.pkl")
+        if regenerate_split:
+            # PageRank scores and top-k PPR neighbors of tasks are computed on the edges kept by the split. They are
+            # keyed by the graph fingerprint, remove them anyway such that stale results never outlive the split.
+            shutil.rmtree(osp.join(self.processed_dir, "pagerank"), ignore_errors=True)
+            shutil.rmtree(osp.join(self.processed_dir, "ppr"), ignore_errors=True)
+        return load_or_save_columnar(path, lambda: split_func(**kwargs), overwrite=regenerate_split)
 
     def _map_to_feature(self, features, feature_map):
+        if isinstance(features, TextArray) and len(feature_map.shape) > 0:
+            return features[feature_map]
         if len(feature_map.shape) == 1:
             return [features[i] for i in feature_map]
         elif len(feature_map.shape) == 0:
@@ -92,6 +150,8 @@ class TAGDataset(InMemoryDataset, ABC):
         r"""Names for all processed file that need to be saved.
         1. processed.pt: save a list of TAGData graphs.
         2. side_data.pt: Any side data that should be stored during preprocessing.
+        Both files are saved in the columnar format, with every tensor stored in its own .npy file under
+        the corresponding *_columns directory.
         """
 
         return ["processed.pkl", "side_data.pkl", ]
@@ -109,13 +169,25 @@ class TAGDataset(InMemoryDataset, ABC):
     def process(self) -> None:
         data_list, side_data = self.gen_data()
         if side_data is not None:
-            torch.save(side_data, self.processed_paths[1])
+            # Pack text list in side data, which are later used as node/edge/label text of the dataset.
+            if isinstance(side_data, (dict, UserDict)):
+                for key, value in list(side_data.items()):
+                    if is_text_collection(value):
+                        side_data[key] = TextArray.from_list(value)
+            save_columnar(side_data, self.processed_paths[1])
         else:
-            torch.save("No side data", self.processed_paths[1])
+            save_columnar("No side data", self.processed_paths[1])
 
+        # Saved link splits, PageRank scores and top-k PPR neighbors are generated from the previous processed data.
+        shutil.rmtree(osp.join(self.processed_dir, "link_split"), ignore_errors=True)
+        shutil.rmtree(osp.join(self.processed_dir, "pagerank"), ignore_errors=True)
+        shutil.rmtree(osp.join(self.processed_dir, "ppr"), ignore_errors=True)
         data, slices = self.collate(data_list)
+        if slices is None:
+            # Single graph, all text are stored in packed format.
+            data = data.text_input_to_text_array()
         print("Saving...")
-        torch.save((data, slices,), self.processed_paths[0], pickle_protocol=4)
+        save_columnar((data, slices,), self.processed_paths[0])
 
     def __str__(self):
         if "sub_name" in self.__dict__:
@@ -141,6 +213,19 @@ class TAGDataset(InMemoryDataset, ABC):
         return self._infer_num_classes(label_map)
 
 
+def tensor_fingerprint(value: Tensor, num_entries: int = 4096) -> str:
+    r"""Return a short fingerprint of a tensor from its shape and the hash of at most about num_entries evenly strided
+    entries, such that only a few pages of a memory-mapped tensor are read.
+    Args:
+        value (Tensor): Input tensor.
+        num_entries (int, optional): Number of entries used in the hash.
+    """
+    flat = value.reshape(-1)
+    step = max(1, flat.numel() // num_entries)
+    digest = hashlib.blake2b(flat[::step].contiguous().cpu().numpy().tobytes(), digest_size=8).hexdigest()
+    return "x".join(str(size) for size in value.shape) + "-" + digest
+
+
 def get_flattened_data_list(data_list: Iterable[Any]) -> list[TAGData]:
     outs: list[TAGData] = []
     for data in data_list:
@@ -0,0 +1,148 @@
+from typing import (
+    Union,
+    Iterator,
+)
+
+import numpy as np
+import torch
+from torch import Tensor
+
+from .data import TAGData
+
+
+class PackedTaskStore:
+    r"""Packed storage of task samples. Every key of the samples is stored as one tensor concatenated along the
+    concatenation dimension of the key together with an int64 offsets array, such that the value of the i-th sample
+    is values[key].narrow(cat_dims[key], ptrs[key][i], ptrs[key][i + 1] - ptrs[key][i]). It behaves like a read-only
+    list of TAGData: integer indexing returns a TAGData with its own copy of the tensors of the sample, such that
+    modifying it in place does not change the store, slicing returns a PackedTaskStore of views, and iteration yields
+    all samples in order. Only the packed tensors are
+    pickled, and :func:`TAGLAS.utils.io.save_columnar` saves them as memory-mappable columns.
+    Args:
+        values (dict[str, Tensor]): Packed tensor of each key.
+        ptrs (dict[str, np.ndarray]): Offsets of each key with shape [num_samples + 1].
+        cat_dims (dict[str, int]): Concatenation dimension of each key.
+    """
+
+    def __init__(self, values: dict[str, Tensor], ptrs: dict[str, np.ndarray], cat_dims: dict[str, int]) -> None:
+        self.values = values
+        self.ptrs = ptrs
+        self.cat_dims = cat_dims
+
+    @classmethod
+    def from_list(cls, data_list: list[TAGData]) -> "PackedTaskStore":
+        r"""Pack a list of samples into a PackedTaskStore. All samples should contain the same keys with tensor values.
+        Args:
+            data_list (list[TAGData]): Samples of the task.
+        """
+        if len(data_list) == 0:
+            return cls({}, {}, {})
+        values = {}
+        ptrs = {}
+        cat_dims = {}
+        keys = list(data_list[0]._store.keys())
+        if any(len(data._store) != len(keys) for data in data_list):
+            raise ValueError("All samples should contain the same keys.")
+        for key in keys:
+            if not all(key in data for data in data_list):
+                raise ValueError(f"All samples should contain the same keys, missing {key} in some samples.")
+            tensors = [data[key] for data in data_list]
+            if not all(isinstance(t, Tensor) for t in tensors):
+                raise ValueError(f"All samples should contain tensor value for key {key}.")
+            cat_dim = data_list[0].__cat_dim__(key, tensors[0])
+            cat_dim = cat_dim + tensors[0].dim() if cat_dim < 0 else cat_dim
+            ptr = np.zeros(len(data_list) + 1, dtype=np.int64)
+            np.cumsum(np.fromiter((t.size(cat_dim) for t in tensors), dtype=np.int64, count=len(tensors)),
+                      out=ptr[1:])
+            values[key] = torch.cat(tensors, dim=cat_dim)
+            ptrs[key] = ptr
+            cat_dims[key] = cat_dim
+        return cls(values, ptrs, cat_dims)
+
+    @classmethod
+    def concat(cls, stores: list["PackedTaskStore"]) -> "PackedTaskStore":
+        r"""Concatenate multiple PackedTaskStore with the same keys into one.
+        Args:
+            stores (list[PackedTaskStore]): PackedTaskStores to concatenate.
+        """
+        stores = [store for store in stores if len(store) > 0]
+        if len(stores) == 0:
+            return cls({}, {}, {})
+        cat_dims = dict(stores[0].cat_dims)
+        values = {}
+        ptrs = {}
+        for key, cat_dim in cat_dims.items():
+            values[key] = torch.cat([store.values[key] for store in stores], dim=cat_dim)
+            ptr = [np.zeros(1, dtype=np.int64)]
+            shift = 0
+            for store in stores:
+                ptr.append(store.ptrs[key][1:] + shift)
+                shift += int(store.ptrs[key][-1])
+            ptrs[key] = np.concatenate(ptr)
+        return cls(values, ptrs, cat_dims)
+
+    def __len__(self) -> int:
+        if len(self.ptrs) == 0:
+            return 0
+        return len(next(iter(self.ptrs.values()))) - 1
+
+    def __getitem__(self, index: Union[int, np.integer, Tensor, slice]) -> Union[TAGData, "PackedTaskStore"]:
+        if isinstance(index, slice):
+            return self.narrow(index)
+        index = int(index)
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError(f"index {index} is out of range for PackedTaskStore with length {len(self)}")
+        update_dict = {}
+        for key, value in self.values.items():
+            ptr = self.ptrs[key]
+            start = int(ptr[index])
+            update_dict[key] = value.narrow(self.cat_dims[key], start, int(ptr[index + 1]) - start).clone()
+        return TAGData(**update_dict)
+
+    def __iter__(self) -> Iterator[TAGData]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def keys(self) -> list[str]:
+        return list(self.values.keys())
+
+    def narrow(self, index: slice) -> "PackedTaskStore":
+        r"""Return the samples in the slice as a new PackedTaskStore. Contiguous slices are views into the packed
+        tensors, so only the part of a memory-mapped store used by the slice is read.
+        Args:
+            index (slice): Slice of samples.
+        """
+        start, stop, step = index.indices(len(self))
+        if step != 1:
+            return self.select(np.arange(start, stop, step))
+        stop = max(start, stop)
+        values = {}
+        ptrs = {}
+        for key, value in self.values.items():
+            ptr = self.ptrs[key][start:stop + 1]
+            values[key] = value.narrow(self.cat_dims[key], int(ptr[0]), int(ptr[-1] - ptr[0]))
+            ptrs[key] = ptr - ptr[0]
+        return PackedTaskStore(values, ptrs, dict(self.cat_dims))
+
+    def select(self, indexs: Union[list, np.ndarray, Tensor]) -> "PackedTaskStore":
+        r"""Gather samples by a 1-d index array in a vectorized way and return a new PackedTaskStore.
+        Args:
+            indexs (Union[list, np.ndarray, Tensor]): Index of samples to keep.
+        """
+        if isinstance(indexs, Tensor):
+            indexs = indexs.cpu().numpy()
+        indexs = np.asarray(indexs, dtype=np.int64).reshape(-1)
+        values = {}
+        ptrs = {}
+        for key, value in self.values.items():
+            ptr = self.ptrs[key]
+            starts = ptr[indexs]
+            lengths = ptr[indexs + 1] - starts
+            new_ptr = np.zeros(len(indexs) + 1, dtype=np.int64)
+            np.cumsum(lengths, out=new_ptr[1:])
+            positions = np.arange(new_ptr[-1], dtype=np.int64) + np.repeat(starts - new_ptr[:-1], lengths)
+            values[key] = value.index_select(self.cat_dims[key], torch.from_numpy(positions))
+            ptrs[key] = new_ptr
+        return PackedTaskStore(values, ptrs, dict(self.cat_dims))
@@ -0,0 +1,252 @@
+import os
+from typing import (
+    Union,
+    Iterable,
+    Iterator,
+    Any,
+)
+
+import numpy as np
+from torch import Tensor
+
+# Number of bytes gathered at once by TextArray.take.
+TAKE_CHUNK_BYTES = 1 << 24
+
+
+class TextArray:
+    r"""Packed string array. All strings are stored in one UTF-8 byte buffer together with an int64 offsets array,
+    such that the i-th string is buffer[offsets[i]:offsets[i + 1]]. It behaves like a read-only list of str:
+    integer indexing returns a str, while slicing or indexing with a list/np.ndarray/Tensor of indices returns a new
+    TextArray gathered in a vectorized way, and a multi-dimensional index returns an object np.ndarray with the same
+    shape as the index. Only the two buffers are pickled.
+    Args:
+        buffer (np.ndarray): UTF-8 encoded bytes of all strings with dtype uint8.
+        offsets (np.ndarray): Start offset of each string in the buffer plus the end offset, with dtype int64.
+    """
+
+    def __init__(self, buffer: np.ndarray, offsets: np.ndarray) -> None:
+        self.buffer = buffer
+        self.offsets = offsets
+
+    @classmethod
+    def from_list(cls, texts: Iterable[Any]) -> "TextArray":
+        r"""Pack a collection of texts into a TextArray.
+        Args:
+            texts (Iterable[Any]): Collection of texts, non-str elements are converted by str().
+        """
+        if isinstance(texts, TextArray):
+            return texts
+        encoded = [(t if isinstance(t, str) else str(t)).encode("utf-8") for t in texts]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum(np.fromiter((len(e) for e in encoded), dtype=np.int64, count=len(encoded)), out=offsets[1:])
+        buffer = np.frombuffer(b"".join(encoded), dtype=np.uint8).copy()
+        return cls(buffer, offsets)
+
+    @classmethod
+    def concat(cls, text_arrays: list["TextArray"]) -> "TextArray":
+        r"""Concatenate multiple TextArray into one.
+        Args:
+            text_arrays (list[TextArray]): TextArrays to concatenate.
+        """
+        if len(text_arrays) == 0:
+            return cls(np.zeros(0, dtype=np.uint8), np.zeros(1, dtype=np.int64))
+        buffer = np.concatenate([np.asarray(t.buffer[t.offsets[0]:t.offsets[-1]]) for t in text_arrays])
+        offsets = [np.zeros(1, dtype=np.int64)]
+        shift = 0
+        for t in text_arrays:
+            offsets.append(t.offsets[1:] - t.offsets[0] + shift)
+            shift += int(t.offsets[-1] - t.offsets[0])
+        return cls(buffer, np.concatenate(offsets))
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "TextArray":
+        r"""Load TextArray saved by :meth:`save`.
+        Args:
+            path (str): Path prefix of the saved buffers.
+            mmap (bool, optional): If true, memory-map the buffers instead of reading them into memory.
+        """
+        mmap_mode = ("r" if mmap else None)
+        return cls(np.load(f"{path}.buffer.npy", mmap_mode=mmap_mode),
+                   np.load(f"{path}.offsets.npy", mmap_mode=mmap_mode))
+
+    def save(self, path: str) -> None:
+        r"""Save the buffers to {path}.buffer.npy and {path}.offsets.npy.
+        Args:
+            path (str): Path prefix of the saved buffers.
+        """
+        packed = self._packed()
+        np.save(f"{path}.buffer.npy", np.asarray(packed.buffer))
+        np.save(f"{path}.offsets.npy", np.asarray(packed.offsets))
+
+    def _packed(self) -> "TextArray":
+        # Drop bytes outside of the current view before saving or pickling.
+        if self.offsets[0] == 0 and self.offsets[-1] == len(self.buffer):
+            return self
+        return TextArray(np.asarray(self.buffer[self.offsets[0]:self.offsets[-1]]), self.offsets - self.offsets[0])
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def _decode(self, i: int) -> str:
+        return self.buffer[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8")
+
+    def take(self, index: np.ndarray) -> "TextArray":
+        r"""Gather strings by a 1-d index array in a vectorized way. The byte positions of the selected strings are
+        built with repeat and cumsum and gathered by one fancy index, in chunks of about TAKE_CHUNK_BYTES bytes to
+        bound the memory of the int64 positions.
+        Args:
+            index (np.ndarray): 1-d integer index array.
+        """
+        index = np.asarray(index, dtype=np.int64)
+        index = np.where(index < 0, index + len(self), index)
+        starts = self.offsets[index]
+        lengths = self.offsets[index + 1] - starts
+        offsets = np.zeros(len(index) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        buffer = np.empty(offsets[-1], dtype=np.uint8)
+        # Split the selected strings into chunks at string boundaries, each with about TAKE_CHUNK_BYTES bytes.
+        bounds = np.searchsorted(offsets, np.arange(0, offsets[-1], TAKE_CHUNK_BYTES, dtype=np.int64))
+        bounds = np.unique(np.concatenate([bounds, [len(index)]]))
+        shift = starts - offsets[:-1]
+        for lo, hi in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+            byte_lo, byte_hi = offsets[lo], offsets[hi]
+            positions = np.arange(byte_lo, byte_hi, dtype=np.int64) + np.repeat(shift[lo:hi], lengths[lo:hi])
+            buffer[byte_lo:byte_hi] = self.buffer[positions]
+        return TextArray(buffer, offsets)
+
+    def __getitem__(self, index: Union[int, slice, list, np.ndarray, Tensor]) -> Union[str, "TextArray", np.ndarray]:
+        if isinstance(index, (int, np.integer)):
+            if index < 0:
+                index += len(self)
+            if index < 0 or index >= len(self):
+                raise IndexError(f"index {index} is out of range for TextArray with length {len(self)}")
+            return self._decode(int(index))
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step == 1:
+                stop = max(start, stop)
+                return TextArray(self.buffer, self.offsets[start:stop + 1])
+            index = np.arange(start, stop, step)
+        if isinstance(index, Tensor):
+            index = index.cpu().numpy()
+        index = np.asarray(index)
+        if index.dtype == np.bool_:
+            index = np.nonzero(index)[0]
+        if index.ndim == 0:
+            return self[int(index)]
+        if index.ndim > 1:
+            return np.asarray(self.take(index.reshape(-1))).reshape(index.shape)
+        return self.take(index)
+
+    def __iter__(self) -> Iterator[str]:
+        buffer = self.buffer[self.offsets[0]:self.offsets[-1]].tobytes()
+        offsets = (self.offsets - self.offsets[0]).tolist()
+        for start, end in zip(offsets[:-1], offsets[1:]):
+            yield buffer[start:end].decode("utf-8")
+
+    def tolist(self) -> list[str]:
+        r"""Decode all strings to a list of str.
+        """
+        return list(iter(self))
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        array = np.empty(len(self), dtype=object)
+        array[:] = self.tolist()
+        return array
+
+    def __add__(self, other: Union["TextArray", list]) -> "TextArray":
+        return TextArray.concat([self, TextArray.from_list(other)])
+
+    def __radd__(self, other: list) -> "TextArray":
+        return TextArray.concat([TextArray.from_list(other), self])
+
+    def __contains__(self, item: str) -> bool:
+        r"""Return true if item is in the array. Only strings with the same encoded length as item are compared,
+        but it is still a linear scan over the offsets, so avoid calling it in a loop over a large array.
+        """
+        if not isinstance(item, str):
+            return False
+        encoded = item.encode("utf-8")
+        starts = self.offsets[:-1]
+        candidates = np.flatnonzero(self.offsets[1:] - starts == len(encoded))
+        buffer = self.buffer
+        for start in starts[candidates].tolist():
+            if buffer[start:start + len(encoded)].tobytes() == encoded:
+                return True
+        return False
+
+    def __reduce__(self):
+        packed = self._packed()
+        return self.__class__, (np.asarray(packed.buffer), np.asarray(packed.offsets))
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(num_texts={len(self)}, num_bytes={int(self.offsets[-1] - self.offsets[0])})"
+
+
+class TextArrayWriter:
+    r"""Incrementally write texts to the on-disk format of :meth:`TextArray.save`, such that only the texts of the
+    current write are kept in memory. Encoded bytes are appended to a temporary file and converted to
+    {path}.buffer.npy together with {path}.offsets.npy on :meth:`close`. Can be used as a context manager.
+    Args:
+        path (str): Path prefix of the saved buffers.
+        block_size (int, optional): Number of bytes copied at a time when finalizing the buffer.
+    """
+
+    def __init__(self, path: str, block_size: int = 1 << 28) -> None:
+        self.path = path
+        self.block_size = block_size
+        self._tmp_path = f"{path}.buffer.tmp"
+        self._tmp_file = open(self._tmp_path, "wb")
+        self._lengths = []
+        self.num_texts = 0
+
+    def write(self, texts: Iterable[Any]) -> None:
+        r"""Append texts to the end of the array.
+        Args:
+            texts (Iterable[Any]): Collection of texts, non-str elements are converted by str().
+        """
+        encoded = [(t if isinstance(t, str) else str(t)).encode("utf-8") for t in texts]
+        self._tmp_file.write(b"".join(encoded))
+        self._lengths.append(np.fromiter((len(e) for e in encoded), dtype=np.int64, count=len(encoded)))
+        self.num_texts += len(encoded)
+
+    def close(self) -> None:
+        r"""Finalize the buffers and remove the temporary file.
+        """
+        self._tmp_file.close()
+        offsets = np.zeros(self.num_texts + 1, dtype=np.int64)
+        if self.num_texts > 0:
+            np.cumsum(np.concatenate(self._lengths), out=offsets[1:])
+        self._lengths = []
+        num_bytes = int(offsets[-1])
+        np.save(f"{self.path}.offsets.npy", offsets)
+        if num_bytes == 0:
+            np.save(f"{self.path}.buffer.npy", np.zeros(0, dtype=np.uint8))
+        else:
+            buffer = np.lib.format.open_memmap(f"{self.path}.buffer.npy", mode="w+", dtype=np.uint8,
+                                               shape=(num_bytes,))
+            with open(self._tmp_path, "rb") as f:
+                for start in range(0, num_bytes, self.block_size):
+                    block = f.read(self.block_size)
+                    buffer[start:start + len(block)] = np.frombuffer(block, dtype=np.uint8)
+            buffer.flush()
+            del buffer
+        os.remove(self._tmp_path)
+
+    def __enter__(self) -> "TextArrayWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self._tmp_file.close()
+            os.remove(self._tmp_path)
+
+
+def is_text_collection(value: Any) -> bool:
+    r"""Return true if the value is a non-empty list of str or a TextArray.
+    """
+    if isinstance(value, TextArray):
+        return True
+    return isinstance(value, list) and len(value) > 0 and all(isinstance(v, str) for v in value)
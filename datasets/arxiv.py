@@ -32,10 +32,13 @@ class Arxiv(TAGDataset):
                  transform: Optional[Callable] = None,
                  pre_transform: Optional[Callable] = None,
                  pre_filter: Optional[Callable] = None,
+                 seed: int = 3407,
+                 regenerate_split: bool = False,
                  **kwargs,
                  ) -> None:
         super().__init__(name, root, transform, pre_transform, pre_filter, **kwargs)
-        self.side_data.link_split, self.side_data.keep_edges = generate_link_split_loop(self._data.edge_index)
+        self.side_data.link_split, self.side_data.keep_edges = self.load_link_split(
+            generate_link_split_loop, regenerate_split, edge_index=self._data.edge_index, seed=seed)
     def raw_file_names(self) -> list:
         return ["nodeidx2paperid.csv.gz", "labelidx2arxivcategeory.csv.gz", "edge.csv.gz",
                 "node_year.csv.gz", "node-feat.csv.gz", "node-label.csv.gz", "train.csv.gz", "valid.csv.gz",
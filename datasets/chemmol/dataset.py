@@ -13,11 +13,14 @@ from torch import LongTensor
 from TAGLAS.constants import HF_REPO_ID
 from TAGLAS.data import TAGData, TAGDataset, BaseDict
 from TAGLAS.utils.io import download_hf_file
-from .gen_data import gen_graph, get_raw_dataset, NAME_TO_SPLIT
+from TAGLAS.utils.dataset import unique_texts_by_key
+from .gen_data import gen_graph, get_raw_dataset, get_atomic_name_dict, NAME_TO_SPLIT
 
 
 class Chembl(TAGDataset):
     r"""Chembl molecules instruction dataset collection. Get available datasets by Chembl.available_datasets
+    Args:
+        num_workers (int, optional): Number of worker processes for featurizing molecules in processing.
     """
     available_datasets = list(NAME_TO_SPLIT.keys())
     graph_description = "This graph is a molecule. Nodes represent chemical atoms and edge represent chemical bonds. "
@@ -28,9 +31,11 @@ class Chembl(TAGDataset):
                  transform: Optional[Callable] = None,
                  pre_transform: Optional[Callable] = None,
                  pre_filter: Optional[Callable] = None,
+                 num_workers: int = 0,
                  **kwargs,
                  ) -> None:
         self.sub_name = name
+        self.num_workers = num_workers
         super().__init__("chembl", root, transform, pre_transform, pre_filter, **kwargs)
         answer = self.side_data["label_texts"]
         label = self.__process_label_features__(answer)
@@ -42,7 +47,7 @@ class Chembl(TAGDataset):
             "label": label,
         }
         self._data.update(texts)
-        self._data = self._data.text_input_to_list()
+        self._data = self._data.text_input_to_list(keep_text_array=self.lazy_text)
 
     @property
     def raw_file_names(self) -> list:
@@ -58,8 +63,8 @@ class Chembl(TAGDataset):
         download_hf_file(HF_REPO_ID, subfolder="chemmol", filename="prompt_pretrain.json", local_dir=self.raw_dir)
 
     def gen_data(self) -> tuple[list[TAGData], Any]:
-        graphs, label_texts, question_texts = get_raw_dataset(self.sub_name, self.raw_dir)
-        pyg_graph, graph_texts, split = gen_graph(graphs, self.sub_name)
+        graphs, label_texts, question_texts = get_raw_dataset(self.sub_name, self.raw_dir, self.num_workers)
+        pyg_graph, graph_texts, split = gen_graph(graphs, self.sub_name, get_atomic_name_dict(self.raw_dir))
         side_data = BaseDict(graph_split=split,
                              question_texts=question_texts,
                              node_texts=graph_texts[0],
@@ -123,35 +128,17 @@ class Chembl(TAGDataset):
             labels = labels.unsqueeze(-1)
         if self.sub_name in ["esol", "freesolv", "lipo"]:
             return indexs, labels, label_map
-        elif self.sub_name == "molproperties":
+
+        # Expand each available (sample, task) pair to a sample.
+        label_map = torch.as_tensor(label_map, dtype=torch.long)
+        rows, cols = torch.nonzero(label_map != -1, as_tuple=True)
+        if self.sub_name == "molproperties":
             question_map = self.question_map[indexs]
-            new_indexs = []
-            new_label_map = []
-            new_labels = []
-            num_sample = len(label_map)
-            num_task = len(label_map[0])
-            for i in range(num_sample):
-                for j in range(num_task):
-                    if label_map[i][j] == -1:  # label not available
-                        continue
-                    new_indexs.append(indexs[i])
-                    new_label_map.append([question_map[i][j], label_map[i][j]])
-                    new_labels.append(labels[i][j])
+            new_label_map = torch.stack([question_map[rows, cols], label_map[rows, cols]], dim=-1)
         else:
-            new_indexs = []
-            new_label_map = []
-            new_labels = []
-            num_sample = len(label_map)
-            num_task = len(label_map[0])
-            for i in range(num_sample):
-                for j in range(num_task):
-                    if label_map[i][j] == -1:  # label not available
-                        continue
-                    new_indexs.append(indexs[i])
-                    new_label_map.append([j, label_map[i][j]])
-                    new_labels.append(labels[i][j])
-
-        return torch.tensor(new_indexs).long(), torch.tensor(new_labels).long(), new_label_map
+            new_label_map = torch.stack([cols, label_map[rows, cols]], dim=-1)
+
+        return indexs[rows], labels[rows, cols].long(), new_label_map.tolist()
 
     def get_GQA_list(self, label_map: list, **kwargs) -> tuple[list[tuple], list, list]:
         r"""Return question and answer list for graph question answering tasks.
@@ -163,7 +150,6 @@ class Chembl(TAGDataset):
         num_sample = len(label_map)
         q_lists = self.question
         label_features = self.answer
-        answer_list = []
 
         if self.sub_name in ["esol", "freesolv", "lipo"]:
             prefix_dict = {
@@ -173,42 +159,28 @@ class Chembl(TAGDataset):
             }
 
             q_idxs = randint(len(q_lists[0]), size=num_sample).tolist()
-            for l in label_map:
-                answer_list.append(label_features[l][prefix_dict[self.sub_name]:] + ".")
-            a_list, a_idxs = np.unique(answer_list, return_inverse=True)
-            a_list = a_list.tolist()
+            a_list, a_idxs = unique_texts_by_key(
+                label_map, lambda l: label_features[l][prefix_dict[self.sub_name]:] + ".")
             q_list = q_lists[0]
 
-            label_map = [(q_idx, l_idx, a_idx) for q_idx, l_idx, a_idx in zip(q_idxs, label_map, a_idxs)]
-            return label_map, q_list, a_list
-
-        elif self.sub_name == "molproperties":
-            question_list = []
-            for q_idx, j in label_map:
-                label_feature = label_features[j]
-                answer = label_feature + "."
-                answer_list.append(answer)
-                question_list.append(q_lists[q_idx])
-
-            a_list, a_idxs = np.unique(np.array(answer_list, dtype=object), return_inverse=True)
-            q_list, q_idxs = np.unique(np.array(question_list, dtype=object), return_inverse=True)
-            a_list = a_list.tolist()
-            q_list = q_list.tolist()
-            label_map = [(q_idx, l_idx[1], a_idx) for q_idx, l_idx, a_idx in zip(q_idxs, label_map, a_idxs)]
+            label_map = [(q_idx, l_idx, a_idx) for q_idx, l_idx, a_idx in zip(q_idxs, label_map, a_idxs.tolist())]
             return label_map, q_list, a_list
 
+        label_map = np.asarray(label_map, dtype=np.int64).reshape(-1, 2)
+        if self.sub_name == "molproperties":
+            question_keys = label_map[:, 0]
+            q_list, q_idxs = unique_texts_by_key(question_keys, lambda k: q_lists[k])
+            a_list, a_idxs = unique_texts_by_key(label_map[:, 1], lambda l: label_features[l] + ".")
         else:
-            question_list = []
-            for i, j in label_map:
-                q_idx = randint(len(q_lists[i]), size=1)[0]
-                label_feature = label_features[j]
-                answer = label_feature[:-1].split("is")[-1].lower().strip() + "."
-                answer_list.append(answer)
-                question_list.append(q_lists[i][q_idx])
-
-            a_list, a_idxs = np.unique(answer_list, return_inverse=True)
-            q_list, q_idxs = np.unique(question_list, return_inverse=True)
-            a_list = a_list.tolist()
-            q_list = q_list.tolist()
-            label_map = [(q_idx, l_idx[1], a_idx) for q_idx, l_idx, a_idx in zip(q_idxs, label_map, a_idxs)]
-            return label_map, q_list, a_list
+            # Randomly select a question for each sample, questions are keyed by the offset in the flattened lists.
+            num_questions = np.array([len(q) for q in q_lists], dtype=np.int64)
+            question_offsets = np.concatenate([[0], np.cumsum(num_questions)[:-1]])
+            tasks = label_map[:, 0]
+            question_keys = question_offsets[tasks] + randint(0, num_questions[tasks])
+            flatten_q_lists = [q for qs in q_lists for q in qs]
+            q_list, q_idxs = unique_texts_by_key(question_keys, lambda k: flatten_q_lists[k])
+            a_list, a_idxs = unique_texts_by_key(
+                label_map[:, 1], lambda l: label_features[l][:-1].split("is")[-1].lower().strip() + ".")
+
+        label_map = list(zip(q_idxs.tolist(), label_map[:, 1].tolist(), a_idxs.tolist()))
+        return label_map, q_list, a_list
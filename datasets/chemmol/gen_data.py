@@ -1,15 +1,28 @@
+import glob
 import json
+import os
 import os.path as osp
 from copy import deepcopy as c
 from itertools import chain
 
+from typing import Optional
+
 import numpy as np
 import pandas as pd
 import torch
 from datasets import load_dataset
+from torch.utils.data import Dataset, DataLoader
+from tqdm import tqdm
 
 from TAGLAS.data import TAGData, BaseDict
-from .mol_utils import smiles2graph
+from TAGLAS.utils.io import torch_safe_save, torch_safe_load, file_lock
+from .mol_utils import smiles2graph, atom_feature_to_text, bond_feature_to_text
+
+# Increase the version if the output of smiles2graph changes, such that the saved cache is regenerated.
+SMILES_CACHE_VERSION = 3
+# Featurized molecules of all subsets are cached by SMILES in one directory. Every update appends a shard with only
+# the newly featurized molecules, so subsets sharing molecules featurize them once.
+SMILES_CACHE_DIR = f"smiles_graph_cache_v{SMILES_CACHE_VERSION}"
 
 NAME_TO_SPLIT = {"chemblpre": "chembl_pretraining",
                  "molproperties": "chembl_pretraining",
@@ -69,7 +82,84 @@ def get_question_label_texts(task2index, name):
     return question_texts, label_texts
 
 
-def get_raw_dataset(name, raw_dir):
+class SmilesFeaturizeHelper(Dataset):
+    r"""Helper class for featurizing molecules with pytorch dataloader multiprocess.
+    Args:
+        smiles (list[str]): SMILES strings of molecules.
+    """
+
+    def __init__(self, smiles: list[str]):
+        self.smiles = smiles
+
+    def __getitem__(self, item):
+        return smiles2graph(self.smiles[item])
+
+    def __len__(self):
+        return len(self.smiles)
+
+
+def load_smiles_cache(cache_dir: str, smiles: set[str]) -> tuple[dict, int]:
+    r"""Load the cached graphs of the given SMILES from all shards in cache_dir. Return the graphs and the number of
+    shards.
+    Args:
+        cache_dir (str): Directory of the featurization cache.
+        smiles (set[str]): SMILES strings to load.
+    """
+    shard_files = sorted(glob.glob(osp.join(cache_dir, "shard_*.pt")))
+    graphs = {}
+    for shard_file in shard_files:
+        shard = torch_safe_load(shard_file)
+        graphs.update((s, graph) for s, graph in shard.items() if s in smiles)
+    return graphs, len(shard_files)
+
+
+def featurize_smiles(
+        smiles: list[str],
+        num_workers: int = 0,
+        cache_dir: Optional[str] = None) -> list[dict]:
+    r"""Featurize molecules with :func:`smiles2graph` and return graphs in the same order as smiles. Molecules are
+    sharded across num_workers processes, and featurized molecules are cached by SMILES in cache_dir such that
+    datasets sharing molecules do not featurize them again. Only SMILES missing in the cache are featurized, and they
+    are appended to the cache as a new shard under a file lock, which is written to a temporary file and replaced
+    atomically.
+    Args:
+        smiles (list[str]): SMILES strings of molecules.
+        num_workers (int, optional): Number of worker processes, featurize in the main process if 0.
+        cache_dir (str, optional): Directory of the featurization cache. If None, no cache is used.
+    """
+    if cache_dir is None:
+        graphs = dict(zip(smiles, _featurize(list(dict.fromkeys(smiles)), num_workers)))
+    else:
+        # Featurize under the lock, such that concurrent processes do not featurize the same molecules twice.
+        with file_lock(osp.join(cache_dir, "cache.lock")):
+            graphs, num_shards = load_smiles_cache(cache_dir, set(smiles))
+            missing = list(dict.fromkeys(s for s in smiles if s not in graphs))
+            if len(missing) > 0:
+                shard = dict(zip(missing, _featurize(missing, num_workers)))
+                shard_file = osp.join(cache_dir, f"shard_{num_shards:05d}.pt")
+                tmp_file = f"{shard_file}.{os.getpid()}.tmp"
+                torch_safe_save(shard, tmp_file)
+                os.replace(tmp_file, shard_file)
+                graphs.update(shard)
+
+    # Shallow copy as returned graphs are updated with dataset specific labels.
+    return [dict(graphs[s]) for s in smiles]
+
+
+def _featurize(smiles: list[str], num_workers: int) -> list[dict]:
+    if len(smiles) == 0:
+        return []
+    helper = SmilesFeaturizeHelper(smiles)
+    loader = DataLoader(helper, batch_size=1000, num_workers=num_workers, shuffle=False, collate_fn=lambda x: x)
+    featurized = []
+    with tqdm(total=len(helper), desc="Featurize molecules.") as pbar:
+        for batch in loader:
+            featurized.extend(batch)
+            pbar.update(len(batch))
+    return featurized
+
+
+def get_raw_dataset(name, raw_dir, num_workers=0):
     print("gen text")
     data = load_dataset("haitengzhao/molecule_property_instruction", split=NAME_TO_SPLIT[name], )
     if name == "molproperties":
@@ -84,7 +174,7 @@ def get_raw_dataset(name, raw_dir):
         question_texts = group.text.agg(lambda x: list(chain.from_iterable(x)))
         mol = [data[i]["graph"] for i in index]
         split = [data[i]["split"] for i in index]
-        chem_dict = get_atomic_name_dict(raw_dir)
+        mol_graphs = featurize_smiles(mol, num_workers, osp.join(raw_dir, SMILES_CACHE_DIR))
 
         processed_label_texts = []
         processed_question_texts = []
@@ -103,7 +193,7 @@ def get_raw_dataset(name, raw_dir):
 
             processed_label_texts.extend(cur_label)
             processed_question_texts.extend(cur_question)
-            graph = smiles2graph(mol[i], chem_dict)
+            graph = mol_graphs[i]
             graph["label_map"] = label_map
             graph["question_map"] = question_map
             graph["split"] = split[i]
@@ -140,7 +230,7 @@ def get_raw_dataset(name, raw_dir):
         mol = [data[i]["graph"] for i in index]
         split = [data[i]["split"] for i in index]
 
-        chem_dict = get_atomic_name_dict(raw_dir)
+        mol_graphs = featurize_smiles(mol, num_workers, osp.join(raw_dir, SMILES_CACHE_DIR))
         label_texts = load_label_json(name, raw_dir)
         task2index = {k: [i, label_texts[k]] for i, k in enumerate(label_texts)}
 
@@ -154,7 +244,7 @@ def get_raw_dataset(name, raw_dir):
                 target_values]
             return_label_texts, indexs = np.unique(return_label_texts, return_inverse=True)
             for i in range(len(mol)):
-                graph = smiles2graph(mol[i], chem_dict)
+                graph = mol_graphs[i]
                 cur_label = indexs[i]
                 graph["label_map"] = cur_label
                 graph["cum_label_map"] = cur_label
@@ -166,7 +256,7 @@ def get_raw_dataset(name, raw_dir):
             cum = np.array([2 * i for i in range(num_tasks)])
             return_label_texts = list(chain.from_iterable(label_texts))
             for i in range(len(mol)):
-                graph = smiles2graph(mol[i], chem_dict)
+                graph = mol_graphs[i]
                 task_lst = [task2index[v][0] for v in tasks.iloc[i].split(",")]
                 label_lst = [1 if v == "Yes" else 0 for v in labels.iloc[i].split(",")]
                 label_map = np.zeros(num_tasks)
@@ -182,29 +272,32 @@ def get_raw_dataset(name, raw_dir):
     return graphs, return_label_texts, question_texts
 
 
-def gen_graph(graphs, name):
-    for g in graphs:
-        g["node_feat"] = ["Chemical atom with the following information: " + t for t in g["node_feat"]]
-        g["edge_feat"] = ["Chemical bond between two atoms with the following information: " + t for t in g["edge_feat"]]
+def intern_features(features: list[np.ndarray]) -> tuple[np.ndarray, list[np.ndarray]]:
+    r"""Intern integer feature rows of all graphs. Return the unique feature rows and the map from each row of each
+    graph to its unique feature.
+    Args:
+        features (list[np.ndarray]): Integer feature array of each graph with shape [num_items, num_features].
+    """
+    all_features = np.concatenate(features, axis=0)
+    unique_features, inverse = np.unique(all_features, axis=0, return_inverse=True)
+    split_points = np.cumsum([len(f) for f in features])[:-1]
+    return unique_features, np.split(inverse.reshape(-1), split_points)
 
 
-    node_texts = []
-    edge_texts = []
+def gen_graph(graphs, name, chem_dict):
+    # Render text once for each unique atom/bond feature.
+    unique_node_feats, node_maps = intern_features([g["node_feat"] for g in graphs])
+    unique_edge_feats, edge_maps = intern_features([g["edge_feat"] for g in graphs])
+    u_node_texts_lst = ["Chemical atom with the following information: " + atom_feature_to_text(f, chem_dict)
+                        for f in unique_node_feats]
+    u_edge_texts_lst = ["Chemical bond between two atoms with the following information: " + bond_feature_to_text(f)
+                        for f in unique_edge_feats]
     data_list = []
-    for g in graphs:
-        node_texts += g["node_feat"]
-        edge_texts += g["edge_feat"]
-    unique_node_texts = set(node_texts)
-    unique_edge_texts = set(edge_texts)
-    u_node_texts_lst = list(unique_node_texts)
-    u_edge_texts_lst = list(unique_edge_texts)
-    node_texts2id = {v: i for i, v in enumerate(u_node_texts_lst)}
-    edge_texts2id = {v: i for i, v in enumerate(u_edge_texts_lst)}
 
     split = BaseDict({"train": [], "valid": [], "test": []})
     for i, g in enumerate(graphs):
-        cur_nt_id = [node_texts2id[v] for v in g["node_feat"]]
-        cur_et_id = [edge_texts2id[v] for v in g["edge_feat"]]
+        cur_nt_id = node_maps[i]
+        cur_et_id = edge_maps[i]
         if name == "molproperties":
             data_list.append(
                 TAGData(node_map=torch.tensor(cur_nt_id, dtype=torch.long),
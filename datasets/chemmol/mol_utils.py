@@ -58,6 +58,10 @@ allowable_features_map = {
 }
 
 
+NUM_ATOM_FEATURES = 9
+NUM_BOND_FEATURES = 3
+
+
 def ReorderCanonicalRankAtoms(mol):
     order = tuple(
         zip(
@@ -70,44 +74,80 @@ def ReorderCanonicalRankAtoms(mol):
     return mol_renum, order
 
 
-def atom_to_feature(atom, chem_dict):
+def atom_to_feature(atom):
     """
-    Converts rdkit atom object to feature list of indices
-    :param mol: rdkit atom object
-    :return: list
+    Converts rdkit atom object to a compact integer feature tuple
+    :param atom: rdkit atom object
+    :return: tuple of (atomic number, chirality, degree, formal charge, num of hydrogen, num of radical electrons,
+             hybridization, is aromatic, is in ring)
     """
 
+    return (
+        int(atom.GetAtomicNum()),
+        int(atom.GetChiralTag()),
+        int(atom.GetTotalDegree()),
+        int(atom.GetFormalCharge()),
+        int(atom.GetTotalNumHs()),
+        int(atom.GetNumRadicalElectrons()),
+        int(atom.GetHybridization()),
+        int(atom.GetIsAromatic()),
+        int(atom.IsInRing()),
+    )
+
+
+def atom_feature_to_text(atom_feature, chem_dict):
+    """
+    Converts atom feature tuple generated by atom_to_feature to text
+    :param atom_feature: atom feature tuple
+    :return: str
+    """
+    (atomic_num, chirality, degree, formal_charge, num_hs, num_radical_e, hybridization, is_aromatic,
+     is_in_ring) = [int(v) for v in atom_feature]
     atom_feature = [
-        chem_dict[int(atom.GetAtomicNum())],
-        "atomic number is " + str(atom.GetAtomicNum()),
+        chem_dict[atomic_num],
+        "atomic number is " + str(atomic_num),
         allowable_features_map["possible_chirality_dict"][
-            str(atom.GetChiralTag())
+            str(Chem.rdchem.ChiralType.values[chirality])
         ]
         + " chirality",
-        "degree of " + str(atom.GetTotalDegree()),
-        "formal charge of " + str(atom.GetFormalCharge()),
-        "num of hydrogen is " + str(atom.GetTotalNumHs()),
-        "num of radical electrons is " + str(atom.GetNumRadicalElectrons()),
-        "hybridization is " + str(atom.GetHybridization()),
-        "is aromatic" if atom.GetIsAromatic() else "not aromatric",
-        "is in ring" if atom.IsInRing() else "not in ring",
+        "degree of " + str(degree),
+        "formal charge of " + str(formal_charge),
+        "num of hydrogen is " + str(num_hs),
+        "num of radical electrons is " + str(num_radical_e),
+        "hybridization is " + str(Chem.rdchem.HybridizationType.values[hybridization]),
+        "is aromatic" if is_aromatic else "not aromatric",
+        "is in ring" if is_in_ring else "not in ring",
     ]
     return " , ".join(atom_feature)
 
 
 def bond_to_feature(bond):
     """
-    Converts rdkit bond object to feature list of indices
-    :param mol: rdkit bond object
-    :return: list
+    Converts rdkit bond object to a compact integer feature tuple
+    :param bond: rdkit bond object
+    :return: tuple of (bond type, bond stereo, is conjugated)
+    """
+    return (
+        int(bond.GetBondType()),
+        int(bond.GetStereo()),
+        int(bond.GetIsConjugated()),
+    )
+
+
+def bond_feature_to_text(bond_feature):
+    """
+    Converts bond feature tuple generated by bond_to_feature to text
+    :param bond_feature: bond feature tuple
+    :return: str
     """
+    bond_type, bond_stereo, is_conjugated = [int(v) for v in bond_feature]
     bond_feature = [
-        str(bond.GetBondType()) + " bond",
+        str(Chem.rdchem.BondType.values[bond_type]) + " bond",
         "bond stereo is "
         + allowable_features_map["possible_bond_stereo_dict"][
-            str(bond.GetStereo())
+            str(Chem.rdchem.BondStereo.values[bond_stereo])
         ],
-        "is conjugated" if bond.GetIsConjugated() else "not conjugated",
+        "is conjugated" if is_conjugated else "not conjugated",
     ]
     return " , ".join(bond_feature)
 
@@ -126,11 +166,12 @@ def compute_cycle(mol):
     return cycle_score
 
 
-def smiles2graph(smiles_string, chem_dict, removeHs=True, reorder_atoms=False):
+def smiles2graph(smiles_string, removeHs=True, reorder_atoms=False):
     """
     Converts SMILES string to graph Data object
     :input: SMILES string (str)
-    :return: graph object
+    :return: graph object, node_feat and edge_feat are integer feature arrays generated by atom_to_feature and
+             bond_to_feature
     """
 
     mol = Chem.MolFromSmiles(smiles_string)
@@ -140,9 +181,8 @@ def smiles2graph(smiles_string, chem_dict, removeHs=True, reorder_atoms=False):
         mol, _ = ReorderCanonicalRankAtoms(mol)
 
     # atoms
-    atom_features_list = []
-    for atom in mol.GetAtoms():
-        atom_features_list.append(atom_to_feature(atom, chem_dict))
+    atom_features_list = [atom_to_feature(atom) for atom in mol.GetAtoms()]
+    atom_features = np.array(atom_features_list, dtype=np.int16).reshape(-1, NUM_ATOM_FEATURES)
 
     # bonds
     edges_list = []
@@ -163,11 +203,12 @@ def smiles2graph(smiles_string, chem_dict, removeHs=True, reorder_atoms=False):
             edges_list.append((j, i))
             edge_features_list.append(edge_feature)
         edge_list = np.array(edges_list)
+    edge_features = np.array(edge_features_list, dtype=np.int16).reshape(-1, NUM_BOND_FEATURES)
 
     graph = dict()
     graph["edge_list"] = edge_list
-    graph["edge_feat"] = edge_features_list
-    graph["node_feat"] = atom_features_list
+    graph["edge_feat"] = edge_features
+    graph["node_feat"] = atom_features
     graph["cycle"] = cycle_score
 
     return graph
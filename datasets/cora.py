@@ -27,11 +27,14 @@ class Cora(TAGDataset):
                  transform: Optional[Callable] = None,
                  pre_transform: Optional[Callable] = None,
                  pre_filter: Optional[Callable] = None,
+                 seed: int = 3407,
+                 regenerate_split: bool = False,
                  **kwargs,
                  ) -> None:
         super().__init__(name, root, transform, pre_transform, pre_filter, **kwargs)
         # Generate random split for link prediction.
-        self.side_data.link_split, self.side_data.keep_edges = generate_link_split(self._data.edge_index)
+        self.side_data.link_split, self.side_data.keep_edges = self.load_link_split(
+            generate_link_split, regenerate_split, edge_index=self._data.edge_index, seed=seed)
 
     def raw_file_names(self) -> list:
         return ["cora.pt", "cora_node.json"]
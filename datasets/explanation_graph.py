@@ -34,7 +34,7 @@ class ExplaGraph(TAGDataset):
             "label": self.side_data["label_texts"],
             "question": self.side_data["question_texts"]}
         self._data.update(texts)
-        self.data = self._data.text_input_to_list()
+        self.data = self._data.text_input_to_list(keep_text_array=self.lazy_text)
 
     def raw_file_names(self) -> list:
         return ["train_dev.tsv", "expla_graph_split.pt"]
@@ -12,7 +12,6 @@ import numpy as np
 import pandas as pd
 import torch
 from torch import Tensor
-from torch.utils.data import Dataset, DataLoader
 from torch_geometric.data import InMemoryDataset
 from tqdm import tqdm
 import json
@@ -20,41 +19,7 @@ from TAGLAS.constants import HF_REPO_ID
 from TAGLAS.data import TAGDataset, TAGData, BaseDict
 from TAGLAS.data.dataset import ROOT
 from TAGLAS.utils.graph import safe_to_undirected
-from TAGLAS.utils.io import download_url, extract_zip, download_hf_file
-
-
-class GenNodes(Dataset):
-    def __init__(self, edge_index, node_exist_map):
-        self.edge_index = edge_index
-        self.node_exist_map = node_exist_map
-
-    def __len__(self):
-        return self.edge_index.size(-1)
-
-    def __getitem__(self, item):
-        source, target = self.edge_index[:, item]
-        source = source.item()
-        target = target.item()
-        if (self.node_exist_map[source] or self.node_exist_map[target]):
-            return source, target
-        else:
-            return None
-
-
-class GenEdges(Dataset):
-    def __init__(self, edge_index, include_nodes):
-        self.edge_index = edge_index
-        self.include_nodes = include_nodes
-
-    def __len__(self):
-        return self.edge_index.size(-1)
-
-    def __getitem__(self, item):
-        source, target = self.edge_index[:, item]
-        if (source in self.include_nodes and target in self.include_nodes):
-            return source, target
-        else:
-            return None
+from TAGLAS.utils.io import download_url, extract_zip, download_hf_file, save_columnar, ColumnarTextWriter
 
 
 class MAG240M(TAGDataset):
@@ -70,21 +35,23 @@ class MAG240M(TAGDataset):
             pre_transform: Optional[Callable] = None,
             pre_filter: Optional[Callable] = None,
             subset: bool = True,
-            num_workers: int = 128,
+            chunk_size: int = 10000000,
+            load_text: str = "eager",
             **kwargs,
     ) -> None:
         self.subset = subset
         self.name = name
-        self.num_workers = num_workers
+        self.load_text = load_text
+        self.chunk_size = chunk_size
         root = (root if root is not None else ROOT)
         root = osp.join(root, self.name)
         super(InMemoryDataset, self).__init__(root, transform, pre_transform, pre_filter)
         update_dict = {}
         key_name_list = ["x", "node_map", "edge_attr", "edge_map", "edge_index", "label", "label_map", "side_data"]
         for i, path in enumerate(self.processed_paths):
-            data = torch.load(path)
+            data = self._load_processed(path)
             update_dict[key_name_list[i]] = data
-        data = TAGData(**update_dict)
+        data = TAGData(**update_dict).text_input_to_list(keep_text_array=self.lazy_text)
         self.data, self.slices = self.collate([data])
 
     def raw_file_names(self) -> list:
@@ -114,41 +81,41 @@ class MAG240M(TAGDataset):
                          local_dir=self.raw_dir)
         download_hf_file(HF_REPO_ID, subfolder="mag240m", filename="new_split_dict.pt", local_dir=self.raw_dir)
 
-    def generate_subset(self, num_nodes, split, edge_index):
-        train, val, test = split["train"], split["valid"], split["test"]
-        node_indexs = train.tolist() + val.tolist() + test.tolist()
-
-        node_exist_map = dict(zip(range(num_nodes), [False] * num_nodes))
-        for idx in node_indexs:
-            node_exist_map[idx] = True
-
-        include_nodes = set()
-        include_edge_index = set()
-        gen_node_helper = GenNodes(edge_index, node_exist_map)
-        loader1 = DataLoader(gen_node_helper, num_workers=self.num_workers, shuffle=False, batch_size=10000,
-                             collate_fn=lambda x: x)
-        with tqdm(total=len(gen_node_helper), desc="Generate task samples.") as pbar:
-            for batch in loader1:
-                for item in batch:
-                    if item is not None:
-                        source, target = item
-                        include_nodes.add(source)
-                        include_nodes.add(target)
-                        include_edge_index.add((source, target))
-                pbar.update(len(batch))
-        gen_edge_helper = GenEdges(edge_index, include_nodes)
-        loader2 = DataLoader(gen_edge_helper, num_workers=self.num_workers, shuffle=False, batch_size=10000,
-                             collate_fn=lambda x: x)
-        with tqdm(total=len(gen_edge_helper), desc="Generate aux edges.") as pbar:
-            for batch in loader2:
-                for item in batch:
-                    if item is not None:
-                        source, target = item
-                        include_edge_index.add((source, target))
-
-                pbar.update(len(batch))
-        include_nodes = torch.tensor(list(include_nodes), dtype=torch.long)
-        include_edge_index = torch.tensor(list(include_edge_index), dtype=torch.long).transpose(0, 1)
+    def generate_subset(self, num_nodes: int, split: dict, edge_index: np.ndarray) -> tuple[Tensor, Tensor]:
+        r"""Generate the subset graph with all edges adjacent to nodes in the split and all edges between the included
+        nodes. The memory-mapped edge_index is streamed in chunks of self.chunk_size edges and filtered by node masks,
+        such that the full edge_index is never loaded into memory.
+        Args:
+            num_nodes (int): Number of nodes in the full graph.
+            split (dict): Node split of the full graph.
+            edge_index (np.ndarray): Edge index of the full graph with shape [2, num_edges], can be memory-mapped.
+        """
+        split_mask = torch.zeros(num_nodes, dtype=torch.bool)
+        for key in ["train", "valid", "test"]:
+            split_mask[split[key]] = True
+
+        num_edges = edge_index.shape[-1]
+        chunk_starts = range(0, num_edges, self.chunk_size)
+
+        def load_chunk(start):
+            chunk = np.asarray(edge_index[:, start: start + self.chunk_size], dtype=np.int64)
+            return torch.from_numpy(chunk[0]), torch.from_numpy(chunk[1])
+
+        node_mask = torch.zeros(num_nodes, dtype=torch.bool)
+        for start in tqdm(chunk_starts, desc="Generate subset nodes."):
+            source, target = load_chunk(start)
+            keep = split_mask[source] | split_mask[target]
+            node_mask[source[keep]] = True
+            node_mask[target[keep]] = True
+
+        edge_keys = []
+        for start in tqdm(chunk_starts, desc="Generate subset edges."):
+            source, target = load_chunk(start)
+            keep = node_mask[source] & node_mask[target]
+            edge_keys.append(source[keep] * num_nodes + target[keep])
+        edge_keys = torch.unique(torch.cat(edge_keys))
+        include_nodes = node_mask.nonzero().view(-1)
+        include_edge_index = torch.stack([edge_keys // num_nodes, edge_keys % num_nodes])
         print("Subset node size:", len(include_nodes))
         print("Subset edge size:", include_edge_index.size(-1))
         return include_nodes, include_edge_index
@@ -160,15 +127,15 @@ class MAG240M(TAGDataset):
                           "Meanwhile, the loading will be super slow and require extremely large RAM. ")
         else:
             warnings.warn(
-                "Generating mag240m subset. Will use multiprocess with large number of workers for faster process. "
-                "You can set num_workers to fit your server.")
+                "Generating mag240m subset. Edges are processed in chunks, "
+                "you can set chunk_size to fit the memory of your server.")
 
         # only include paper2paper relation as we don't have text features for other two node type.
         node_split = torch.load(self.raw_paths[1])
         node_split = BaseDict(**node_split)
 
         # additional label description.
-        with open(self.raw_paths[-1]) as f:
+        with open(self.raw_paths[-2]) as f:
             category_desc = json.load(f)
         label_names = []
         label_text_list = []
@@ -180,21 +147,21 @@ class MAG240M(TAGDataset):
             ordered_desc[label] = desc
 
         print("Saving label...")
-        torch.save(label_text_list, self.processed_paths[5], pickle_protocol=4)
+        save_columnar(label_text_list, self.processed_paths[5])
 
         del label_text_list
         gc.collect()
         edge_attr = ["Connected two papers have a citation relationship."]
-        torch.save(edge_attr, self.processed_paths[2], pickle_protocol=4)
+        save_columnar(edge_attr, self.processed_paths[2])
 
         meta_data = torch.load(self.raw_paths[0])
         num_nodes = meta_data["paper"]
-        edge_index = torch.from_numpy(np.load(self.raw_paths[-1]))
+        edge_index = np.load(self.raw_paths[-1], mmap_mode="r")
         print("begin process edge_index")
         if self.subset:
             subset_node, subset_edge_index = self.generate_subset(num_nodes, node_split, edge_index)
-            mapping = edge_index[0].new_full((num_nodes,), -1)
-            mapping[subset_node] = torch.arange(subset_node.size(0), device=edge_index.device)
+            mapping = torch.full((num_nodes,), -1, dtype=torch.long)
+            mapping[subset_node] = torch.arange(subset_node.size(0))
             edge_index = mapping[subset_edge_index]
             train_idx = mapping[node_split["train"]]
             train_idx = train_idx[train_idx != -1]
@@ -206,49 +173,51 @@ class MAG240M(TAGDataset):
             test_idx = test_idx[test_idx != -1]
             node_split["test"] = test_idx
 
+        else:
+            edge_index = torch.from_numpy(np.array(edge_index, dtype=np.int64))
+
         node_split["val"] = node_split["valid"]
         # node_split.__delitem__("valid")
 
         edge_index, _ = safe_to_undirected(edge_index)
         print("Saving edge...")
-        torch.save(edge_index, self.processed_paths[4], pickle_protocol=4)
+        save_columnar(edge_index, self.processed_paths[4])
 
         num_edges = edge_index.size(-1)
         edge_map = torch.zeros([num_edges], dtype=torch.long)
-        torch.save(edge_map, self.processed_paths[3], pickle_protocol=4)
+        save_columnar(edge_map, self.processed_paths[3])
         del edge_index
         del edge_map
         gc.collect()
 
+        label_map = torch.from_numpy(np.load(self.raw_paths[3])).long()
+        if self.subset:
+            label_map = label_map[subset_node]
+        save_columnar(label_map, self.processed_paths[6])
+
+        # Stream node text and only keep the rows in the subset, packed texts are written to disk chunk by chunk.
         print("begin read node text.")
-        node_text_ls = []
+        if self.subset:
+            node_mask = np.zeros(num_nodes, dtype=bool)
+            node_mask[subset_node.numpy()] = True
         chunksize = 1000000
-        total_chunks = num_nodes // chunksize
-        chunk_idx = 0
-        print(total_chunks)
-        for chunk in tqdm(pd.read_csv(self.raw_paths[2], chunksize=chunksize), total=total_chunks):
-            print(chunk_idx)
-            chunk = chunk.fillna("missing")
-            text = (
-                    "Academic paper with title and abstract: "
-                    + chunk["title"]
-                    + ". "
-                    + chunk["abstract"]
-            )
-            node_text_ls.extend(text.tolist())
-            chunk_idx += 1
+        total_chunks = (num_nodes + chunksize - 1) // chunksize
+        with ColumnarTextWriter(self.processed_paths[0]) as writer:
+            for chunk in tqdm(pd.read_csv(self.raw_paths[2], chunksize=chunksize), total=total_chunks):
+                if self.subset:
+                    chunk = chunk[node_mask[chunk.index.values]]
+                chunk = chunk.fillna("missing")
+                text = (
+                        "Academic paper with title and abstract: "
+                        + chunk["title"]
+                        + ". "
+                        + chunk["abstract"]
+                )
+                writer.write(text.tolist())
+            num_texts = writer.num_texts
         print("Saving node...")
-        if self.subset:
-            node_text_ls = [node_text_ls[idx] for idx in subset_node]
-
-        label_map = torch.from_numpy(np.load(self.raw_paths[3])).long()
-        label_map = label_map[subset_node]
-        torch.save(label_map, self.processed_paths[6], pickle_protocol=4)
-
-        torch.save(node_text_ls, self.processed_paths[0], pickle_protocol=4)
-        node_map = torch.arange(len(node_text_ls), dtype=torch.long)
-        torch.save(node_map, self.processed_paths[1], pickle_protocol=4)
-        del node_text_ls
+        node_map = torch.arange(num_texts, dtype=torch.long)
+        save_columnar(node_map, self.processed_paths[1])
         del node_map
         gc.collect()
 
@@ -260,9 +229,9 @@ class MAG240M(TAGDataset):
     def process(self) -> None:
         side_data = self.gen_data()
         if side_data is not None:
-            torch.save(side_data, self.processed_paths[-1])
+            save_columnar(side_data, self.processed_paths[-1])
         else:
-            torch.save("No side data", self.processed_paths[-1])
+            save_columnar("No side data", self.processed_paths[-1])
 
     def get_NP_indexs_labels(self, split: str = "train") -> tuple[Tensor, Tensor, list]:
         r"""Return sample labels and their corresponding index for the node-level tasks and the given split.
@@ -13,10 +13,27 @@ from torch import Tensor
 
 from TAGLAS.constants import HF_REPO_ID
 from TAGLAS.data import TAGDataset, TAGData, BaseDict
-from TAGLAS.utils.dataset import generate_link_split
+from TAGLAS.utils.dataset import generate_link_split, concat_text_columns, ids_to_index
 from TAGLAS.utils.io import download_url, extract_zip, download_hf_file
 
 
+def generate_rating_link_split(edge_index: Tensor, labels: Tensor, seed: int = 3407,
+                               to_undirected: bool = True) -> tuple[dict, Tensor]:
+    r"""Generate link split on rating edges, which are the first len(labels) edges in edge_index. If to_undirected,
+    keep_edges also contains the reversed edge of every kept rating edge.
+    Args:
+        edge_index (Tensor): Edges of the graph, rating edges followed by their reversed edges if to_undirected.
+        labels (Tensor): Rating label of all rating edges.
+        seed (int, optional): Random seed for the split.
+        to_undirected (bool, optional): If true, edge_index contains reversed edges.
+    """
+    num_edges = labels.size(0)
+    link_split, keep_edges = generate_link_split(edge_index[:, :num_edges], labels=labels, seed=seed)
+    if to_undirected:
+        keep_edges = torch.cat([keep_edges, keep_edges + num_edges], dim=-1)
+    return link_split, keep_edges
+
+
 class ML1M(TAGDataset):
     MOVIE_HEADERS = ["movieId", "title", "genres"]
     USER_HEADERS = ["userId", "gender", "age", "occupation", "zipCode"]
@@ -32,23 +49,33 @@ class ML1M(TAGDataset):
             pre_transform: Optional[Callable] = None,
             pre_filter: Optional[Callable] = None,
             to_undirected: Optional[bool] = True,
+            seed: int = 3407,
+            regenerate_split: bool = False,
             **kwargs,
     ) -> None:
+        self.undirected = to_undirected
         super().__init__(name, root, transform, pre_transform, pre_filter, **kwargs)
-        self.side_data.link_split, self.side_data.keep_edges = generate_link_split(self.edge_index, labels=self._data.label_map)
+        self.side_data.link_split, self.side_data.keep_edges = self.load_link_split(
+            generate_rating_link_split, regenerate_split, edge_index=self.edge_index, labels=self._data.label_map,
+            seed=seed, to_undirected=self.undirected)
 
-        if to_undirected:
-            self.to_undirected()
+    @property
+    def processed_file_names(self) -> list:
+        r"""The undirected variant of the graph is processed and saved separately from the directed one.
+        """
+        suffix = ("_undirected" if self.undirected else "")
+        return [f"processed{suffix}.pkl", f"side_data{suffix}.pkl"]
 
-    def to_undirected(self) -> None:
+    def to_undirected(self, data: TAGData) -> None:
+        r"""Add the reversed edge for every rating edge in data. Called once during the process.
+        Args:
+            data (TAGData): Generated graph, updated in place.
+        """
         resverse_edge_text = "Source movie rated by the target user with rating: "
-        data = self._data
         edge_index = data.edge_index
-        num_edges = edge_index.size(-1)
         edge_attr = data.edge_attr
         num_edge_attr = len(edge_attr)
         edge_map = data.edge_map
-        keep_edges = self.side_data.keep_edges
 
         label = data.label
         row, col = edge_index
@@ -56,14 +83,12 @@ class ML1M(TAGDataset):
         edge_attr_reverse = [resverse_edge_text + i for i in label]
         edge_attr = edge_attr + edge_attr_reverse
         edge_map = torch.cat([edge_map, edge_map + num_edge_attr], dim=-1)
-        keep_edges = torch.cat([keep_edges, keep_edges + num_edges], dim=-1)
         update_dict = {
             "edge_index": edge_index,
             "edge_attr": edge_attr,
             "edge_map": edge_map,
         }
-        self._data.update(update_dict)
-        self.side_data.keep_edges = keep_edges
+        data.update(update_dict)
 
     def raw_file_names(self) -> list:
         return ['movies.dat', 'users.dat', 'ratings.dat', "occupation.csv"]
@@ -89,14 +114,9 @@ class ML1M(TAGDataset):
             engine='python',
         )
 
-        movie_texts = []
         movie_prefix = "Movie with title and genre. "
-        for i in range(movie_df.shape[0]):
-            title = movie_df.iloc[i]['title']
-            genres = movie_df.iloc[i]['genres']
-            movie_texts.append(movie_prefix + "Title: " + title + ". Genre: " + genres)
+        movie_texts = concat_text_columns([movie_prefix + "Title: ", movie_df["title"], ". Genre: ", movie_df["genres"]])
         num_of_movie = len(movie_texts)
-        movie_mapping = {idx: i for i, idx in enumerate(movie_df.index)}
 
         # Process user data:
         user_df = pd.read_csv(
@@ -111,14 +131,11 @@ class ML1M(TAGDataset):
         )
         occupation_desc = pd.read_csv(self.raw_paths[-1], header=None, index_col=0)
 
-        user_texts = []
         user_prefix = "User in the movie rating platform with the following information: "
-        for i in range(user_df.shape[0]):
-            gender = ('man' if user_df.iloc[i]['gender'] == 'M' else 'woman')
-            age = str(user_df.iloc[i]['age'])
-            occupation = occupation_desc.iloc[int(user_df.iloc[i]['occupation']), 0]
-            user_texts.append(user_prefix + "gender: " + gender + ", age: " + age + ", occupation: " + occupation)
-        user_mapping = {idx: i for i, idx in enumerate(user_df.index)}
+        gender = np.where(user_df["gender"].to_numpy() == "M", "man", "woman")
+        occupation = occupation_desc.iloc[:, 0].to_numpy()[user_df["occupation"].astype(np.int64).to_numpy()]
+        user_texts = concat_text_columns([user_prefix + "gender: ", gender, ", age: ", user_df["age"],
+                                          ", occupation: ", occupation])
 
         num_of_user = len(user_texts)
         node_map = torch.arange((num_of_movie + num_of_user))
@@ -136,11 +153,9 @@ class ML1M(TAGDataset):
 
         label = ["1", "2", "3", "4", "5"]
         edge_text = "Source user rate the target movie with rating: "
-        col = torch.tensor([movie_mapping[idx] for idx in rating_df['movieId']], dtype=torch.long)
-        row = torch.tensor([user_mapping[idx] for idx in rating_df['userId']], dtype=torch.long) + num_of_movie
-        rating = rating_df["rating"]
-        label_map = (rating - 1).tolist()
-        label_map = torch.tensor(label_map, dtype=torch.long)
+        col = torch.from_numpy(ids_to_index(rating_df["movieId"], movie_df.index.astype(np.int64)))
+        row = torch.from_numpy(ids_to_index(rating_df["userId"], user_df.index.astype(np.int64))) + num_of_movie
+        label_map = torch.from_numpy(rating_df["rating"].to_numpy(dtype=np.int64) - 1)
 
         edge_index = torch.stack([row, col])
         edge_attr = [edge_text + i for i in label]
@@ -153,6 +168,9 @@ class ML1M(TAGDataset):
                        edge_attr=edge_attr,
                        edge_map=label_map)
 
+        if self.undirected:
+            self.to_undirected(data)
+
         return [data], BaseDict()
 
     def get_LP_indexs_labels(self, split: str = "train") -> tuple[Tensor, Tensor, list]:
@@ -192,14 +210,15 @@ class ML1M_CLS(ML1M):
             pre_filter: Optional[Callable] = None,
             to_undirected: Optional[bool] = True,
             threshold: Optional[int] = 4,
+            **kwargs,
     ) -> None:
-        super().__init__(name, root, transform, pre_transform, pre_filter, to_undirected)
+        super().__init__(name, root, transform, pre_transform, pre_filter, to_undirected, **kwargs)
         self.threshold = threshold
         reg_label = self.label
         reg_label_map = self.label_map
         cls_label = ["No", "Yes"]
-        cls_label_map = torch.tensor([0 if int(reg_label[l]) < self.threshold else 1 for l in reg_label_map],
-                                     dtype=torch.long)
+        reg_label_value = torch.tensor([int(l) for l in reg_label], dtype=torch.long)
+        cls_label_map = (reg_label_value[reg_label_map] >= self.threshold).long()
         self._data.update(
             {"label": cls_label, "label_map": cls_label_map, "reg_label": reg_label, "reg_label_map": reg_label_map})
 
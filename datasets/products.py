@@ -13,6 +13,7 @@ from torch_geometric.utils import to_edge_index
 
 from TAGLAS.constants import HF_REPO_ID
 from TAGLAS.data import TAGDataset, TAGData, BaseDict
+from TAGLAS.utils.dataset import concat_text_columns
 from TAGLAS.utils.io import download_hf_file
 
 
@@ -53,14 +54,10 @@ class Products(TAGDataset):
         label_map = data.y.squeeze()
         x_original = data.x
         edge_attr = ["Connected two products are purchased together."]
-        node_text_list = []
         node_text_prefix = "Product from Amazon platform with title and content: "
-
-        for i in range(data.num_nodes):
-            node_title = (node_desc.iloc[i, 2] if node_desc.iloc[i, 2] is not np.nan else "missing")
-            node_content = (node_desc.iloc[i, 3] if node_desc.iloc[i, 3] is not np.nan else "missing")
-            text = "Title: " + node_title + ". Content: " + node_content
-            node_text_list.append(node_text_prefix + text)
+        node_desc = node_desc.iloc[:data.num_nodes]
+        node_text_list = concat_text_columns([node_text_prefix + "Title: ", node_desc.iloc[:, 2],
+                                              ". Content: ", node_desc.iloc[:, 3]])
 
         edge_index = data.adj_t.to_symmetric()
         edge_index = to_edge_index(edge_index)[0]
@@ -18,10 +18,14 @@ from TAGLAS.utils.io import extract_zip, download_hf_file
 
 
 def textualize_graph(data):
+    r"""Convert a scene graph to node texts, edge texts and edge_index with shape [2, num_edges].
+    """
     # mapping from object id to index
     objectid2nodeid = {object_id: idx for idx, object_id in enumerate(data['objects'].keys())}
-    nodes = []
-    edges = []
+    node_texts = []
+    edge_texts = []
+    src = []
+    dst = []
     for objectid, object in data['objects'].items():
         # nodes
         node_attr = f'Object in an image. Name: {object["name"]}'
@@ -29,18 +33,15 @@ def textualize_graph(data):
         if len(object['attributes']) > 0:
             node_attr = node_attr + '; attribute: ' + (', ').join(object["attributes"])
         node_attr += '; (x,y,w,h): ' + str((x, y, w, h))
-        nodes.append({'node_id': objectid2nodeid[objectid], 'node_attr': node_attr})
+        node_texts.append(node_attr)
 
         # edges
         for rel in object['relations']:
-            src = objectid2nodeid[objectid]
-            dst = objectid2nodeid[rel['object']]
-            edge_attr = rel['name']
-            edge_attr = "Relation between two objects: " + edge_attr
-            edges.append({'src': src, 'edge_attr': edge_attr, 'dst': dst})
+            src.append(objectid2nodeid[objectid])
+            dst.append(objectid2nodeid[rel['object']])
+            edge_texts.append("Relation between two objects: " + rel['name'])
 
-    return pd.DataFrame(nodes, columns=['node_id', 'node_attr']), pd.DataFrame(edges,
-                                                                               columns=['src', 'edge_attr', 'dst'])
+    return node_texts, edge_texts, np.array([src, dst], dtype=np.int64).reshape(2, -1)
 
 
 class SceneGraph(TAGDataset):
@@ -65,7 +66,7 @@ class SceneGraph(TAGDataset):
             "question": self.side_data["question_texts"],
             "answer": self.side_data["answer_texts"]}
         self._data.update(texts)
-        self.data = self._data.text_input_to_list()
+        self.data = self._data.text_input_to_list(keep_text_array=self.lazy_text)
 
     def raw_file_names(self) -> list:
         return ["train_sceneGraphs.json", "questions.csv", "scene_graph_split.pt"]
@@ -79,38 +80,30 @@ class SceneGraph(TAGDataset):
     def gen_data(self) -> tuple[list[TAGData], Any]:
         dataset = json.load(open(self.raw_paths[0]))
         question_df = pd.read_csv(self.raw_paths[1])
+
+        # Group questions by image in a single pass, images are ordered by their first appearance and questions of
+        # each image keep their original order.
+        image_codes, image_ids = pd.factorize(question_df.image_id)
+        question_order = np.argsort(image_codes, kind="stable")
+        question_df = question_df.iloc[question_order]
+        num_questions = np.bincount(image_codes, minlength=len(image_ids))
+        question_offsets = np.concatenate([[0], np.cumsum(num_questions)])
+        sample_image_ids = np.repeat(np.asarray(image_ids), num_questions)
+
         node_txt_list = []
         edge_txt_list = []
-        question_txt_list = []
-        label_txt_list = []
-        answer_txt_list = []
         graphs = []
-        image_ids = question_df.image_id.unique()
-
         for image_id in tqdm(image_ids):
-            object_ = dataset[str(image_id)]
-            nodes, edges = textualize_graph(object_)
-            x = nodes.node_attr.tolist()
-            edge_attr = edges.edge_attr.tolist()
+            x, edge_attr, edge_index = textualize_graph(dataset[str(image_id)])
             node_map = torch.arange(len(node_txt_list), len(node_txt_list) + len(x))
             node_txt_list.extend(x)
             edge_map = torch.arange(len(edge_txt_list), len(edge_txt_list) + len(edge_attr))
             edge_txt_list.extend(edge_attr)
-            edge_index = torch.tensor([edges.src, edges.dst]).long()
-
-            question_text = question_df[question_df.image_id == image_id]["question"].tolist()
-            question_map = torch.arange(len(question_txt_list), len(question_txt_list) + len(question_text))
-            question_txt_list.extend(question_text)
-
-            label_text = question_df[question_df.image_id == image_id]["answer"].tolist()
-            label_map = torch.arange(len(label_txt_list), len(label_txt_list) + len(label_text))
-            label_txt_list.extend(label_text)
-
-            answer_text = question_df[question_df.image_id == image_id]["full_answer"].tolist()
-            answer_map = torch.arange(len(answer_txt_list), len(answer_txt_list) + len(answer_text))
-            answer_txt_list.extend(answer_text)
+            graphs.append((node_map, edge_map, torch.from_numpy(edge_index)))
 
-            graphs.append((image_id, node_map, edge_map, edge_index, question_map, label_map, answer_map))
+        question_txt_list = question_df["question"].tolist()
+        label_txt_list = question_df["answer"].tolist()
+        answer_txt_list = question_df["full_answer"].tolist()
 
         unique_node_text, node_inverse_map = np.unique(np.array(node_txt_list, dtype=object), return_inverse=True)
         unique_edge_text, edge_inverse_map = np.unique(np.array(edge_txt_list, dtype=object), return_inverse=True)
@@ -131,28 +124,24 @@ class SceneGraph(TAGDataset):
         answer_inverse_map = torch.from_numpy(answer_inverse_map).long()
 
         data_list = []
-        id_list = []
-        for image_id, node_map, edge_map, edge_index, question_map_list, label_map_list, answer_map_list in graphs:
-            for question_map, label_map, answer_map in zip(question_map_list, label_map_list, answer_map_list):
+        for i, (node_map, edge_map, edge_index) in enumerate(graphs):
+            node_map = node_inverse_map[node_map]
+            edge_map = edge_inverse_map[edge_map]
+            for j in range(question_offsets[i], question_offsets[i + 1]):
                 data_list.append(
-                    TAGData(node_map=node_inverse_map[node_map],
+                    TAGData(node_map=node_map,
                             edge_index=edge_index,
-                            edge_map=edge_inverse_map[edge_map],
-                            label_map=label_inverse_map[label_map],
-                            question_map=question_inverse_map[question_map],
-                            answer_map=answer_inverse_map[answer_map]
+                            edge_map=edge_map,
+                            label_map=label_inverse_map[j],
+                            question_map=question_inverse_map[j],
+                            answer_map=answer_inverse_map[j]
                             )
                 )
-                id_list.append(image_id)
 
-        id_list = torch.tensor(id_list)
         graph_split = torch.load(self.raw_paths[2])
-        train_mask = torch.tensor([True if id in graph_split["train"] else False for id in id_list])
-        val_mask = torch.tensor([True if id in graph_split["val"] else False for id in id_list])
-        test_mask = torch.tensor([True if id in graph_split["test"] else False for id in id_list])
-        train_idx = torch.where(train_mask)[0]
-        val_idx = torch.where(val_mask)[0]
-        test_idx = torch.where(test_mask)[0]
+        train_idx = torch.from_numpy(np.nonzero(np.isin(sample_image_ids, np.asarray(graph_split["train"])))[0])
+        val_idx = torch.from_numpy(np.nonzero(np.isin(sample_image_ids, np.asarray(graph_split["val"])))[0])
+        test_idx = torch.from_numpy(np.nonzero(np.isin(sample_image_ids, np.asarray(graph_split["test"])))[0])
         graph_split = BaseDict(train=train_idx, val=val_idx, test=test_idx)
 
         side_data = BaseDict(graph_split=graph_split,
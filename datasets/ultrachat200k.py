@@ -36,7 +36,7 @@ class UltraChat200k(TAGDataset):
             "question": self.side_data["question_texts"],
             "answer": self.side_data["answer_texts"]}
         self._data.update(texts)
-        self.data = self._data.text_input_to_list()
+        self.data = self._data.text_input_to_list(keep_text_array=self.lazy_text)
 
     def raw_file_names(self) -> list:
         return []
@@ -7,7 +7,6 @@ from typing import (
 )
 
 import numpy as np
-import pandas as pd
 import torch
 from torch import Tensor
 from tqdm import tqdm
@@ -37,7 +36,7 @@ class WebQSP(TAGDataset):
             "question": self.side_data["question_texts"],
             "answer": self.side_data["answer_texts"]}
         self._data.update(texts)
-        self.data = self._data.text_input_to_list()
+        self.data = self._data.text_input_to_list(keep_text_array=self.lazy_text)
 
     def raw_file_names(self) -> list:
         return ["train_sceneGraphs.json", "questions.csv", "scene_graph_split.pt"]
@@ -59,7 +58,9 @@ class WebQSP(TAGDataset):
                 answer_txt_list.append(answer)
                 label_txt_list.append(answer)
                 raw_nodes = {}
-                raw_edges = []
+                edge_attr = []
+                src = []
+                dst = []
                 for tri in example["graph"]:
                     h, r, t = tri
                     h = h.lower()
@@ -68,31 +69,20 @@ class WebQSP(TAGDataset):
                         raw_nodes[h] = len(raw_nodes)
                     if t not in raw_nodes:
                         raw_nodes[t] = len(raw_nodes)
-                    raw_edges.append({
-                        "src": raw_nodes[h],
-                        "edge_attr": r,
-                        "dst": raw_nodes[t]
-                    })
-                nodes = pd.DataFrame([{
-                    "node_id": v,
-                    "node_attr": k,
-                } for k, v in raw_nodes.items()],
-                    columns=["node_id", "node_attr"])
-                edges = pd.DataFrame(raw_edges,
-                                     columns=["src", "edge_attr", "dst"])
-                nodes.node_attr = nodes.node_attr.fillna("")
-                x = nodes.node_attr.tolist()
+                    src.append(raw_nodes[h])
+                    dst.append(raw_nodes[t])
+                    edge_attr.append(r)
+                x = list(raw_nodes)
                 node_map = torch.arange(len(node_txt_list), len(node_txt_list) + len(x))
-                edge_attr = edges.edge_attr.tolist()
                 edge_map = torch.arange(len(edge_txt_list), len(edge_txt_list) + len(edge_attr))
                 node_txt_list.extend(x)
                 edge_txt_list.extend(edge_attr)
+                edge_index = torch.from_numpy(np.array([src, dst], dtype=np.int64).reshape(2, -1))
 
                 label_map = torch.tensor([count]).long()
-                graph_list.append((nodes, edges, node_map, edge_map, label_map, label_map, label_map))
+                graph_list.append((edge_index, node_map, edge_map, label_map, label_map, label_map))
                 count += 1
 
-
         unique_node_text, node_inverse_map = np.unique(np.array(node_txt_list, dtype=object), return_inverse=True)
         unique_edge_text, edge_inverse_map = np.unique(np.array(edge_txt_list, dtype=object), return_inverse=True)
         unique_question_text, question_inverse_map = np.unique(np.array(question_txt_list, dtype=object),
@@ -113,12 +103,7 @@ class WebQSP(TAGDataset):
         answer_inverse_map = torch.from_numpy(answer_inverse_map).long()
 
         data_list = []
-        for nodes, edges, node_map, edge_map, label_map, answer_map, question_map in graph_list:
-            edge_index = torch.tensor([
-                edges.src.tolist(),
-                edges.dst.tolist(),
-            ], dtype=torch.long)
-
+        for edge_index, node_map, edge_map, label_map, answer_map, question_map in graph_list:
             data_list.append(
                 TAGData(node_map=node_inverse_map[node_map],
                         edge_index=edge_index,
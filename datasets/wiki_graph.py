@@ -7,7 +7,6 @@ from typing import (
 )
 
 import numpy as np
-import pandas as pd
 import torch
 from torch import Tensor
 from tqdm import tqdm
@@ -18,24 +17,23 @@ from TAGLAS.utils.io import extract_zip, download_hf_file
 
 
 def textualize_graph(data):
-    # mapping from object id to index
-    nodes = []
-    edges = []
+    r"""Convert a wiki graph to node texts, edge texts and edge_index with shape [2, num_edges].
+    """
     entities = data['entities']
     relations = data['relations']
-    for nid in entities:
-        node_attr = f'This node describes {entities[nid]["name"]}. {entities[nid]["desc"]}'
-        nodes.append({'node_id': int(nid), 'node_attr': node_attr})
+    node_texts = [f'This node describes {entities[nid]["name"]}. {entities[nid]["desc"]}' for nid in entities]
+    edge_texts = []
+    src = []
+    dst = []
     for rel in relations:
-        src = int(rel["source"])
-        dst = int(rel["target"])
-        edge_attr = f'The source node {rel["general_relation"]} target node. Specifically, {rel["specific_relation"]}'
-        rev_edge_attr = f'The target node {rel["general_relation"]} source node. Specifically, {rel["specific_relation"]}'
-        edges.append({'src': src, 'edge_attr': edge_attr, 'dst': dst})
-        edges.append({'src': dst, 'edge_attr': rev_edge_attr, 'dst': src})
+        s = int(rel["source"])
+        t = int(rel["target"])
+        edge_texts.append(f'The source node {rel["general_relation"]} target node. Specifically, {rel["specific_relation"]}')
+        edge_texts.append(f'The target node {rel["general_relation"]} source node. Specifically, {rel["specific_relation"]}')
+        src.extend((s, t))
+        dst.extend((t, s))
 
-    return pd.DataFrame(nodes, columns=['node_id', 'node_attr']), pd.DataFrame(edges,
-                                                                               columns=['src', 'edge_attr', 'dst'])
+    return node_texts, edge_texts, np.array([src, dst], dtype=np.int64).reshape(2, -1)
 
 
 class WikiGraph(TAGDataset):
@@ -60,7 +58,7 @@ class WikiGraph(TAGDataset):
             "question": self.side_data["question_texts"],
             "answer": self.side_data["answer_texts"]}
         self._data.update(texts)
-        self.data = self._data.text_input_to_list()
+        self.data = self._data.text_input_to_list(keep_text_array=self.lazy_text)
 
     def raw_file_names(self) -> list:
         return ["wikiGraph.json"]
@@ -72,34 +70,20 @@ class WikiGraph(TAGDataset):
         dataset = json.load(open(self.raw_paths[0]))
         node_txt_list = []
         edge_txt_list = []
-        question_txt_list = []
-        label_txt_list = []
-        answer_txt_list = []
         graphs = []
 
         for i, obj in tqdm(enumerate(dataset)):
-            nodes, edges = textualize_graph(obj)
-            x = nodes.node_attr.tolist()
-            edge_attr = edges.edge_attr.tolist()
+            x, edge_attr, edge_index = textualize_graph(obj)
             node_map = torch.arange(len(node_txt_list), len(node_txt_list) + len(x))
             node_txt_list.extend(x)
             edge_map = torch.arange(len(edge_txt_list), len(edge_txt_list) + len(edge_attr))
             edge_txt_list.extend(edge_attr)
-            edge_index = torch.tensor([edges.src, edges.dst]).long()
-
-            question_text = ["What is your name?"]
-            question_map = torch.arange(len(question_txt_list), len(question_txt_list) + len(question_text))
-            question_txt_list.extend(question_text)
-
-            label_text = ["GOFA"]
-            label_map = torch.arange(len(label_txt_list), len(label_txt_list) + len(label_text))
-            label_txt_list.extend(label_text)
-
-            answer_text = ["My name is GOFA."]
-            answer_map = torch.arange(len(answer_txt_list), len(answer_txt_list) + len(answer_text))
-            answer_txt_list.extend(answer_text)
+            graphs.append((i, node_map, edge_map, torch.from_numpy(edge_index)))
 
-            graphs.append((i, node_map, edge_map, edge_index, question_map, label_map, answer_map))
+        # Every graph shares the same question, label and answer.
+        question_txt_list = ["What is your name?"] * len(graphs)
+        label_txt_list = ["GOFA"] * len(graphs)
+        answer_txt_list = ["My name is GOFA."] * len(graphs)
 
         unique_node_text, node_inverse_map = np.unique(np.array(node_txt_list, dtype=object), return_inverse=True)
         unique_edge_text, edge_inverse_map = np.unique(np.array(edge_txt_list, dtype=object), return_inverse=True)
@@ -120,24 +104,20 @@ class WikiGraph(TAGDataset):
         answer_inverse_map = torch.from_numpy(answer_inverse_map).long()
 
         data_list = []
-        id_list = []
-        for i, node_map, edge_map, edge_index, question_map_list, label_map_list, answer_map_list in graphs:
-            for question_map, label_map, answer_map in zip(question_map_list, label_map_list, answer_map_list):
-                data_list.append(
-                    TAGData(node_map=node_inverse_map[node_map],
-                            edge_index=edge_index,
-                            edge_map=edge_inverse_map[edge_map],
-                            label_map=label_inverse_map[label_map],
-                            question_map=question_inverse_map[question_map],
-                            answer_map=answer_inverse_map[answer_map]
-                            )
-                )
-                id_list.append(i)
-
-        id_list = torch.tensor(id_list)
-        train_idx = torch.arange(len(id_list))
-        val_idx = torch.arange(len(id_list))
-        test_idx = torch.arange(len(id_list))
+        for i, node_map, edge_map, edge_index in graphs:
+            data_list.append(
+                TAGData(node_map=node_inverse_map[node_map],
+                        edge_index=edge_index,
+                        edge_map=edge_inverse_map[edge_map],
+                        label_map=label_inverse_map[i],
+                        question_map=question_inverse_map[i],
+                        answer_map=answer_inverse_map[i]
+                        )
+            )
+
+        train_idx = torch.arange(len(data_list))
+        val_idx = torch.arange(len(data_list))
+        test_idx = torch.arange(len(data_list))
         graph_split = BaseDict(train=train_idx, val=val_idx, test=test_idx)
 
         side_data = BaseDict(graph_split=graph_split,
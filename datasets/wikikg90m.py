@@ -1,11 +1,13 @@
 from typing import (
     Optional,
     Callable, Any,
+    Union,
 )
 import os
-from TAGLAS.data import TAGData, TAGDataset
+from TAGLAS.data import TAGData, TAGDataset, TextArray
 import os.path as osp
-from TAGLAS.utils.io import download_url, extract_zip
+from TAGLAS.utils.io import (download_url, extract_zip, load_or_save_columnar, load_columnar, is_columnar, file_lock,
+                             ColumnarTextWriter)
 import numpy as np
 import pandas as pd
 import torch
@@ -56,10 +58,12 @@ class WikiKG90M(TAGDataset):
             pre_filter: Optional[Callable] = None,
             to_undirected: bool = True,
             fast_data_load: bool = False,
+            load_text: str = "eager",
             **kwargs,
 
     ) -> None:
         self.name = name
+        self.load_text = load_text
         root = (root if root is not None else ROOT)
         root = osp.join(root, self.name)
         super(InMemoryDataset, self).__init__(root, transform, pre_transform, pre_filter)
@@ -116,9 +120,7 @@ class WikiKG90M(TAGDataset):
             ordered_desc[label] = desc
 
         if fast_data_load:
-            node_raw_text = pd.read_csv(self.raw_paths[5], index_col=0)
-            node_raw_text.fillna("missing", inplace=True)
-            x = get_node_text(node_raw_text)
+            x = self.load_node_text()
             node_map = torch.arange(len(x))
 
             if self.to_undirected:
@@ -128,60 +130,80 @@ class WikiKG90M(TAGDataset):
             label_map = None
             side_data = BaseDict(label_description=ordered_desc)
         else:
-            node_raw_text = pd.read_csv(self.raw_paths[5], index_col=0)
-            node_raw_text.fillna("missing", inplace=True)
-            x = get_node_text(node_raw_text)
+            x = self.load_node_text()
             node_map = torch.arange(len(x))
 
-            train_hrt = np.load(self.raw_paths[1])
-            valid_dict = {}
-            valid_dict['hr'] = np.load(self.raw_paths[2])
-            valid_dict['t'] = np.load(self.raw_paths[3])
-            valid_hrt = np.concatenate(
-                [valid_dict["hr"], valid_dict["t"].reshape(-1, 1)], axis=1
-            )
-            edge_index = []
-            edge_map = []
-            for triplet in train_hrt:
-                edge_index.append(
-                    [
-                        triplet[0],
-                        triplet[2],
-                    ]
-                )
-                edge_map.append(triplet[1])
-            num_train = len(edge_index)
-            for triplet in valid_hrt:
-                edge_index.append(
-                    [
-                        triplet[0],
-                        triplet[2],
-                    ]
-                )
-                edge_map.append(triplet[1])
-            num_val = len(edge_index) - num_train
-
-            edge_index = torch.tensor(edge_index).transpose(0, 1)
-            edge_map = torch.tensor(edge_map)
-            label_map = edge_map
-
-            keep_edges = torch.arange(num_train)
+            graph = self.load_graph(num_edge_type=len(edge_attr))
+            edge_index, edge_map, label_map = graph["edge_index"], graph["edge_map"], graph["label_map"]
             if self.to_undirected:
-                num_edges = edge_index.size(-1)
-                edge_index = torch.cat([edge_index, torch.stack([edge_index[1], edge_index[0]])], dim=-1)
-                num_edge_type = len(edge_attr)
                 edge_attr = edge_attr + get_rel_text(rel_raw_text, False)
-                edge_map = torch.cat([edge_map, edge_map + num_edge_type], dim=-1)
-                keep_edges = torch.cat([keep_edges, keep_edges + num_edges], dim=-1)
-
-            train_idx = torch.arange(num_train)
-            val_idx = torch.arange(num_train, num_val + num_train,)
-
-            split_dict = BaseDict(train=train_idx, val=val_idx)
+            split_dict = BaseDict(train=graph["train_idx"], val=graph["val_idx"])
+            keep_edges = graph["keep_edges"]
             side_data = BaseDict(link_split=split_dict, keep_edges=keep_edges, label_description=ordered_desc)
 
         return x, edge_index, edge_attr, node_map, edge_map, labels, label_map, side_data
 
+    def load_node_text(self) -> Union[list[str], TextArray]:
+        r"""Load texts of all entities. If load_text is "lazy", entity texts are streamed from entity.csv to a packed
+        TextArray in processed_dir the first time and memory-mapped in later loads, such that only the indexed texts
+        are decoded. Otherwise, build the list of all entity texts.
+        """
+        if not self.lazy_text:
+            node_raw_text = pd.read_csv(self.raw_paths[5], index_col=0)
+            node_raw_text.fillna("missing", inplace=True)
+            return get_node_text(node_raw_text)
+        path = osp.join(self.processed_dir, "node_text.pkl")
+        if not is_columnar(path):
+            with file_lock(f"{path}.lock"):
+                # Another process may have written the texts while waiting for the lock.
+                if not is_columnar(path):
+                    with ColumnarTextWriter(path) as writer:
+                        for chunk in pd.read_csv(self.raw_paths[5], index_col=0, chunksize=1000000):
+                            writer.write(get_node_text(chunk.fillna("missing")))
+        return load_columnar(path)
+
+    def load_graph(self, num_edge_type: int) -> dict:
+        r"""Load edges of the graph from processed_dir. The edges are built from the raw triplets and saved in the
+        columnar format the first time, and memory-mapped in later loads.
+        Args:
+            num_edge_type (int): Number of relation types, used to map reversed edges to reversed relations.
+        """
+        suffix = ("_undirected" if self.to_undirected else "")
+        path = osp.join(self.processed_dir, f"graph{suffix}.pkl")
+        return load_or_save_columnar(path, lambda: self.build_graph(num_edge_type))
+
+    def build_graph(self, num_edge_type: int) -> dict:
+        r"""Build edge_index, edge_map and link split of the graph from the memory-mapped raw triplets.
+        Args:
+            num_edge_type (int): Number of relation types, used to map reversed edges to reversed relations.
+        """
+        train_hrt = np.load(self.raw_paths[1], mmap_mode="r")
+        val_hr = np.load(self.raw_paths[2], mmap_mode="r")
+        val_t = np.load(self.raw_paths[3], mmap_mode="r")
+        num_train = len(train_hrt)
+        num_val = len(val_hr)
+        num_edges = num_train + num_val
+
+        head = np.concatenate([train_hrt[:, 0], val_hr[:, 0]]).astype(np.int64)
+        tail = np.concatenate([train_hrt[:, 2], val_t.reshape(-1)]).astype(np.int64)
+        relation = np.concatenate([train_hrt[:, 1], val_hr[:, 1]]).astype(np.int64)
+        label_map = torch.from_numpy(relation)
+        keep_edges = np.arange(num_train, dtype=np.int64)
+        if self.to_undirected:
+            edge_index = np.stack([np.concatenate([head, tail]), np.concatenate([tail, head])])
+            edge_map = np.concatenate([relation, relation + num_edge_type])
+            keep_edges = np.concatenate([keep_edges, keep_edges + num_edges])
+        else:
+            edge_index = np.stack([head, tail])
+            edge_map = relation
+
+        return {"edge_index": torch.from_numpy(edge_index),
+                "edge_map": torch.from_numpy(edge_map),
+                "label_map": label_map,
+                "keep_edges": torch.from_numpy(keep_edges),
+                "train_idx": torch.arange(num_train),
+                "val_idx": torch.arange(num_train, num_edges)}
+
     def process(self) -> None:
         return None
 
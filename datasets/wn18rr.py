@@ -28,18 +28,28 @@ class WN18RR(TAGDataset):
                  to_undirected: bool = True,
                  **kwargs,
                  ) -> None:
+        self.undirected = to_undirected
         super().__init__(name, root, transform, pre_transform, pre_filter, **kwargs)
-        if to_undirected:
-            self.to_undirected()
 
-    def to_undirected(self) -> None:
-        data = self._data
+    @property
+    def processed_file_names(self) -> list:
+        r"""The undirected variant of the graph is processed and saved separately from the directed one.
+        """
+        suffix = ("_undirected" if self.undirected else "")
+        return [f"processed{suffix}.pkl", f"side_data{suffix}.pkl"]
+
+    def to_undirected(self, data: TAGData, side_data: BaseDict) -> None:
+        r"""Add the reversed edge with an inverse relation for every edge in data. Called once during the process.
+        Args:
+            data (TAGData): Generated graph, updated in place.
+            side_data (BaseDict): Generated side data, keep_edges is updated in place.
+        """
         edge_index = data.edge_index
         edge_attr = data.edge_attr
         edge_attr_original = data.edge_attr_original
         edge_map = data.edge_map
-        keep_edges = self.side_data.keep_edges
-        labels = self.data.label
+        keep_edges = side_data.keep_edges
+        labels = data.label
 
         num_edges = edge_index.size(-1)
         num_edge_type = len(edge_attr)
@@ -56,8 +66,7 @@ class WN18RR(TAGDataset):
             "edge_map": edge_map,
         }
         data.update(update_dict)
-        self._data = data
-        self.side_data.update(keep_edges=keep_edges)
+        side_data.update(keep_edges=keep_edges)
 
     def raw_file_names(self) -> list:
         return ["entity2text.txt", "train.txt", "valid.txt", "test.txt", "wn18rr.json"]
@@ -159,6 +168,9 @@ class WN18RR(TAGDataset):
             keep_edges=keep_edges,
             label_description=ordered_desc)
 
+        if self.undirected:
+            self.to_undirected(data, side_data)
+
         return [data], side_data
 
     def get_LP_indexs_labels(self, split: str = "train") -> tuple[Tensor, Tensor, list]:
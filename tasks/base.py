@@ -1,6 +1,8 @@
+import math
 import os
 import os.path as osp
 import random
+import shutil
 import types
 import warnings
 from abc import ABC, abstractmethod
@@ -18,10 +20,16 @@ import torch
 from torch import Tensor, LongTensor
 from torch.utils.data import Dataset
 from torch_geometric.loader.dataloader import Collater
+from tqdm import tqdm
 
-from TAGLAS.data import TAGDataset, TAGData
-from TAGLAS.utils.graph import edge_index_to_sparse_csr, personalized_pagerank
-from .process import feature_embedding_process, subgraph_process, value_to_tensor, parallel_build_sample_process
+from TAGLAS.data import TAGDataset, TAGData, TextArray, PackedTaskStore
+from TAGLAS.data.dataset import tensor_fingerprint
+from TAGLAS.data.text_array import is_text_collection
+from TAGLAS.utils.graph import edge_index_to_sparse_csr, edge_index_to_target_csr, get_relabel_buffer
+from TAGLAS.utils.io import save_columnar, load_columnar, remove_columnar, ShardedTaskWriter, ShardedTaskStore
+from .process import (feature_embedding_process, subgraph_process, ppr_subgraph_process, parallel_subgraph_process,
+                      ppr_topk_process, pagerank_process, value_to_tensor, parallel_build_sample_process,
+                      MultiprocessHelper)
 
 
 class BaseTask(Dataset, ABC):
@@ -115,24 +123,51 @@ class BaseTask(Dataset, ABC):
         save_name = self.save_name
         return osp.join(self.root, self.__class__.__name__[:-4], save_name)
 
+    @property
+    def shard_dir(self):
+        return osp.join(self.processed_dir, "shards")
+
     def save_task(self):
+        r"""Save generated task in the columnar format, such that from_saved can memory-map it. Samples that are not
+        packed are saved by torch.save as before.
+        """
         print("Save generated task...")
         if not osp.exists(self.processed_dir):
             os.makedirs(self.processed_dir)
-        torch.save((self.question_features, self.answer_features),
-                   osp.join(self.processed_dir, self.processed_file_names[0]), pickle_protocol=4)
-        torch.save(self.data_list, osp.join(self.processed_dir, self.processed_file_names[1]), pickle_protocol=4)
-        torch.save(self.additional_data, osp.join(self.processed_dir, self.processed_file_names[2]), pickle_protocol=4)
+        qa_features = tuple(TextArray.from_list(features) if is_text_collection(features) else features
+                            for features in (self.question_features, self.answer_features))
+        save_columnar(qa_features, osp.join(self.processed_dir, self.processed_file_names[0]))
+        data_list_path = osp.join(self.processed_dir, self.processed_file_names[1])
+        if isinstance(self.data_list, ShardedTaskStore):
+            # Samples are already written to shards during the build.
+            remove_columnar(data_list_path)
+        else:
+            shutil.rmtree(self.shard_dir, ignore_errors=True)
+            if isinstance(self.data_list, PackedTaskStore):
+                save_columnar(self.data_list, data_list_path)
+            else:
+                # Avoid one column file for every tensor of every sample.
+                remove_columnar(data_list_path)
+                torch.save(self.data_list, data_list_path, pickle_protocol=4)
+        save_columnar(self.additional_data, osp.join(self.processed_dir, self.processed_file_names[2]))
 
     def from_saved(self):
+        r"""Load saved task if it exists. Columns are memory-mapped, so opening is close to constant time, all
+        processes loading the same task share the page cache, and only the pages of accessed samples are read.
+        """
         qa_feature_path = osp.join(self.processed_dir, self.processed_file_names[0])
         data_list_path = osp.join(self.processed_dir, self.processed_file_names[1])
         additional_data_path = osp.join(self.processed_dir, self.processed_file_names[2])
-        if osp.exists(qa_feature_path) and osp.exists(data_list_path) and osp.exists(additional_data_path):
+        is_sharded = ShardedTaskStore.exists(self.shard_dir)
+        if (osp.exists(qa_feature_path) and (is_sharded or osp.exists(data_list_path))
+                and osp.exists(additional_data_path)):
             print("load task from saved file...")
-            self.question_features, self.answer_features = torch.load(qa_feature_path)
-            self.data_list = torch.load(data_list_path)
-            self.additional_data = torch.load(additional_data_path)
+            self.question_features, self.answer_features = load_columnar(qa_feature_path)
+            if is_sharded:
+                self.data_list = ShardedTaskStore(self.shard_dir)
+            else:
+                self.data_list = load_columnar(data_list_path)
+            self.additional_data = load_columnar(additional_data_path)
             self.__load_features__()
             return True
         else:
@@ -215,17 +250,27 @@ class BaseTask(Dataset, ABC):
         pass
 
     def __after_process__(self):
-        r"""Convert all text features to np.array and process any user defined post process function.
+        r"""Convert all text features to np.array and process any user defined post process function. If the dataset
+        loads text lazily, text features are packed to TextArray instead, such that only indexed texts are decoded.
         """
+        lazy_text = getattr(self.dataset, "lazy_text", False)
         for key in self.__dict__.keys():
             if "_features" in key:
                 value = getattr(self, key, None)
                 if value is not None:
-                    if isinstance(value, list):
+                    if lazy_text and is_text_collection(value):
+                        setattr(self, key, value if isinstance(value, TextArray) else TextArray.from_list(value))
+                    elif isinstance(value, TextArray):
+                        setattr(self, key, np.asarray(value))
+                    elif isinstance(value, list):
                         setattr(self, key, np.array(value, dtype=object))
         if self.filter_func is not None:
             keep_indexs = [self.filter_func(data) for data in self.data_list]
-            self.data_list = [self.data_list[i] for i, keep in enumerate(keep_indexs) if keep]
+            if isinstance(self.data_list, list):
+                self.data_list = [self.data_list[i] for i, keep in enumerate(keep_indexs) if keep]
+            else:
+                # Packed or lazy task, gather kept samples at once.
+                self.data_list = self.data_list.select([i for i, keep in enumerate(keep_indexs) if keep])
 
 
     def __before_build_task__(self):
@@ -266,11 +311,37 @@ class BaseTask(Dataset, ABC):
         self.__before_process__()
         self.sample_indexs, self.sample_labels, self.sample_label_map = self.__process_split_and_label__()
         self.__before_build_task__()
-        self.data_list = self.__build_task__()
+        self.data_list = self.__pack_data_list__(self.__build_task__())
         self.__load_features__()
 
+    def __pack_data_list__(self, data_list: Any) -> Any:
+        r"""Pack the list of built samples into a PackedTaskStore, which saves the memory and the time of saving and
+        loading. Samples that can not be packed are kept in the list. A single sample (like the whole graph of
+        DefaultTask) is kept as it is, as packing would only copy its possibly memory-mapped tensors into memory.
+        Args:
+            data_list (Any): Built samples returned by __build_task__.
+        """
+        if not isinstance(data_list, list) or len(data_list) <= 1:
+            return data_list
+        try:
+            return PackedTaskStore.from_list(data_list)
+        except ValueError as e:
+            warnings.warn(f"Can not pack task samples, keep them in list. {e}")
+            return data_list
+
+    def __get_sample__(self, item: int) -> TAGData:
+        r"""Return the stored sample. Samples in list are copied to avoid modifying them, while packed and lazy tasks
+        already return a new TAGData with its own tensors for each access.
+        Args:
+            item (int): Index of the sample.
+        """
+        data = self.data_list[item]
+        if isinstance(self.data_list, list):
+            data = c(data)
+        return data
+
     def __getitem__(self, item: int) -> Any:
-        data = c(self.data_list[item])
+        data = self.__get_sample__(item)
         node_map = data.node_map
         edge_map = data.edge_map
         label_map = data.label_map
@@ -288,7 +359,7 @@ class BaseTask(Dataset, ABC):
                 data = post_func(data, task_class=self)
         return data
 
-    def batch_unique_feature(self, features: Union[Tensor, np.ndarray, list]):
+    def batch_unique_feature(self, features: Union[Tensor, np.ndarray, TextArray, list]):
 
         if isinstance(features, Tensor):
             # If feature is tensor, don't need to generate unique feature and feature map.
@@ -297,6 +368,10 @@ class BaseTask(Dataset, ABC):
         else:
             if isinstance(features, list) and isinstance(features[0], np.ndarray):
                 features = np.concatenate(features, axis=0)
+            elif isinstance(features, list) and isinstance(features[0], TextArray):
+                features = TextArray.concat(features)
+            if isinstance(features, TextArray):
+                features = np.asarray(features)
             unique_feature, feature_map = np.unique(features, return_inverse=True)
             feature_map = torch.from_numpy(feature_map).long()
 
@@ -343,7 +418,16 @@ class BaseTask(Dataset, ABC):
     def num_classes(self) -> int:
         r"""Returns the number of classes in the dataset."""
         data_list = self.data_list
-        if 'label_map' in data_list[0] and isinstance(data_list[0].label_map, Tensor):
+        if isinstance(data_list, MultiprocessHelper):
+            # Lazy tasks build samples on the fly, read the label map of all samples without building them.
+            label_map = data_list.sample_label_map
+            if not isinstance(label_map, Tensor):
+                label_map = torch.cat([value_to_tensor(l).view(-1) for l in label_map], dim=0)
+        elif isinstance(data_list, PackedTaskStore) and 'label_map' in data_list.values:
+            label_map = data_list.values['label_map']
+        elif isinstance(data_list, ShardedTaskStore) and len(data_list) > 0 and 'label_map' in data_list[0]:
+            label_map = torch.cat([data_list.shard(i).values['label_map'] for i in range(data_list.num_shards)], dim=0)
+        elif 'label_map' in data_list[0] and isinstance(data_list[0].label_map, Tensor):
             label_map = torch.cat([data.label_map for data in data_list if 'label_map' in data], dim=0)
         else:
             label_map = torch.as_tensor([data.y for data in data_list if 'label_map' in data])
@@ -499,7 +583,8 @@ class DefaultTask(BaseTask):
 
     def __before_process__(self) -> None:
         # before process, convert all text keys to list for fast processing and efficient saving.
-        self.data = self.data.text_input_to_list()
+        # Packed text of lazily loaded dataset is kept such that only indexed texts are decoded.
+        self.data = self.data.text_input_to_list(keep_text_array=getattr(self.dataset, "lazy_text", False))
 
     def __get_node_feature__(self) -> Union[Tensor, np.ndarray, list]:
         """
@@ -591,9 +676,25 @@ class SubgraphTask(DefaultTask):
         hop (int, optional): Number of hop for extracting subgraph. Default is 3.
         max_nodes_per_hop (int, optional): Maximum number of nodes when sampling each hop. If nodes at the current hop is larger
          than the value, randomly select nodes with the number of value. Default is 5.
-        num_workers (int, optional): Number of worker for task generation with multiprocess.
+        num_workers (int, optional): Number of worker for task generation with multiprocess. Workers share the graph in
+                                shared memory and each generates the subgraphs of a contiguous chunk of samples.
         to_sparse (bool, optional): If true, first convert it to sparse tensor then do the subgraph sampling.
                                 Efficient when dealing with large graph.
+        batch_size (int, optional): If to_sparse is true and batch_size > 0, subgraphs of batch_size samples are
+                                sampled together by the batched sampler. Otherwise, sample subgraph for each sample
+                                separately. Also the number of samples in each chunk of the workers. Default is 0.
+        subgraph_mode (str, optional): How to construct the subgraph, choose from ("hop", "ppr"). If "hop", expand
+                                hop by hop from the target nodes. If "ppr", use the subgraph induced by the top-k
+                                personalized PageRank neighbors of the target nodes, which always uses the sparse format.
+        ppr_alpha (float, optional): Damping factor of personalized PageRank in "ppr" mode. Default is 0.85.
+        ppr_eps (float, optional): Residual threshold of the local push in "ppr" mode. Default is 1e-4.
+        ppr_topk (int, optional): Number of PPR neighbors of each target node in "ppr" mode. Default is 32.
+        lazy (bool, optional): If true, only keep target indexes, labels and the shared graph when building the task,
+                                and extract the subgraph of each sample in __getitem__, so that subgraphs are sampled
+                                in the dataloader workers and differ in every epoch. Lazy tasks are not saved.
+        shard_size (int, optional): If larger than 0, stream built samples to numbered shards of shard_size samples
+                                in the processed directory instead of keeping all of them in memory, and index them
+                                across shards after building. Default is 0.
     """
 
     def __init__(
@@ -612,34 +713,82 @@ class SubgraphTask(DefaultTask):
             num_workers: int = 0,
             to_sparse: bool = True,
             use_ppr_sampling: bool = False,
+            batch_size: int = 0,
+            subgraph_mode: str = "hop",
+            ppr_alpha: float = 0.85,
+            ppr_eps: float = 1e-4,
+            ppr_topk: int = 32,
+            lazy: bool = False,
+            shard_size: int = 0,
             **kwargs) -> None:
+        if lazy and (save_data or from_saved):
+            warnings.warn("Lazy task samples subgraphs on the fly and can not be saved or loaded, "
+                          "ignore save_data and from_saved.")
+            save_data = False
+            from_saved = False
+        self.lazy = lazy
+        self.shard_size = shard_size
+        if subgraph_mode not in ["hop", "ppr"]:
+            raise ValueError(f"subgraph_mode should be chosen from (hop, ppr), got {subgraph_mode}.")
+        self.subgraph_mode = subgraph_mode
+        self.ppr_alpha = ppr_alpha
+        self.ppr_eps = ppr_eps
+        self.ppr_topk = ppr_topk
+        self.ppr_nodes = None
+        self.ppr_index = None
         self.hop = hop
         self.max_nodes_per_hop = max_nodes_per_hop
         self.num_workers = num_workers
         self.use_ppr_sampling = use_ppr_sampling
         self.ppr_scores = None
         self.to_sparse = to_sparse
+        self.relabel_buffer = None
+        self.batch_size = batch_size
         super().__init__(dataset, split, save_data, from_saved, save_name, post_funcs, filter_func, sample_size, sample_mode,
                          **kwargs)
 
     @property
     def default_save_name(self):
+        if self.subgraph_mode == "ppr":
+            graph_setting = ["ppr", str(self.ppr_alpha), str(self.ppr_eps), str(self.ppr_topk)]
+        else:
+            graph_setting = [str(self.hop), str(self.max_nodes_per_hop)]
         if isinstance(self.sample_size, list):
-            return "_" + "_".join([self.split, str(self.hop), str(self.max_nodes_per_hop), "specified_index"])
+            return "_" + "_".join([self.split] + graph_setting + ["specified_index"])
         else:
-            return "_" + "_".join(
-                [self.split, str(self.hop), str(self.max_nodes_per_hop), str(self.sample_size), self.sample_mode])
+            return "_" + "_".join([self.split] + graph_setting + [str(self.sample_size), self.sample_mode])
 
     def __process_graph__(
             self,
             index: Union[int, list, Tensor],
             edge_index: LongTensor,
             node_map: LongTensor,
-            edge_map: LongTensor) -> tuple[LongTensor, LongTensor, LongTensor, LongTensor]:
-        """Extract ego-subgraph around the index.
+            edge_map: LongTensor,
+            subgraph: Optional[tuple] = None) -> tuple[LongTensor, LongTensor, LongTensor, LongTensor]:
+        """Extract ego-subgraph around the index. If subgraph is given, use the precomputed subgraph instead.
+        """
+        return self.__sample_subgraph__(index, edge_index, node_map, edge_map, subgraph)
+
+    def __sample_subgraph__(
+            self,
+            index: Union[int, list, Tensor],
+            edge_index: LongTensor,
+            node_map: LongTensor,
+            edge_map: LongTensor,
+            subgraph: Optional[tuple] = None) -> tuple[LongTensor, LongTensor, LongTensor, LongTensor]:
+        """Return the ego-subgraph around the index. If subgraph is given (like the ones sampled in batch), return it
+        directly.
         """
-        return subgraph_process(index, edge_index, node_map, edge_map,
-                                self.hop, self.max_nodes_per_hop, to_sparse=self.to_sparse, ppr_scores=self.ppr_scores)
+        if subgraph is not None:
+            return subgraph
+        if self.subgraph_mode == "ppr":
+            return ppr_subgraph_process(index.view(1, -1), edge_index, node_map, self.ppr_nodes, self.ppr_index)[0]
+        if self.to_sparse:
+            # Every process (like each dataloader worker in lazy mode) has its own copy of the task and its buffer.
+            self.relabel_buffer = get_relabel_buffer(edge_index.sparse_size(0), self.relabel_buffer)
+        return subgraph_process(index, edge_index, node_map, edge_map, self.hop, self.max_nodes_per_hop,
+                                to_sparse=self.to_sparse, ppr_scores=self.ppr_scores,
+                                relabel_buffer=self.relabel_buffer)
 
     def __build_sample__(
             self,
@@ -649,9 +798,11 @@ class SubgraphTask(DefaultTask):
             edge_index: LongTensor,
             node_map: LongTensor,
             edge_map: LongTensor,
+            subgraph: Optional[tuple] = None,
     ):
         index = value_to_tensor(index)
-        edge_index, node_map, edge_map, target_index = self.__process_graph__(index, edge_index, node_map, edge_map)
+        edge_index, node_map, edge_map, target_index = self.__process_graph__(index, edge_index, node_map, edge_map,
+                                                                              subgraph)
         target_index = value_to_tensor(target_index)
         label_map = value_to_tensor(label_map)
         y = value_to_tensor(y, to_long=False)
@@ -664,19 +815,69 @@ class SubgraphTask(DefaultTask):
         edge_index = self.data.edge_index
         node_map = self.data.node_map
         edge_map = self.data.edge_map
-        if self.to_sparse:
-            edge_index = edge_index_to_sparse_csr(edge_index, edge_map)
         if self.use_ppr_sampling:
-            print("Compute ppr score.")
-            self.ppr_scores = personalized_pagerank(edge_index, len(node_map))
-            print(self.ppr_scores)
+            # PageRank scores only depend on the graph, saved with the dataset and keyed by the fingerprint of the graph
+            # (like the edges kept by a link split), such that all tasks on the same graph share them.
+            file_name = osp.join(self.dataset.processed_dir, "pagerank",
+                                 f"pagerank_{tensor_fingerprint(edge_index)}.pkl")
+            self.ppr_scores = pagerank_process(edge_index, len(node_map), file_name=file_name)
+        if self.subgraph_mode == "ppr":
+            # Top-k PPR neighbors only depend on the graph, saved with the dataset and keyed by the fingerprint of the
+            # graph (like the edges kept by a link split) and the setting.
+            setting = f"{tensor_fingerprint(edge_index)}_{self.ppr_alpha}_{self.ppr_eps}_{self.ppr_topk}"
+            file_name = osp.join(self.dataset.processed_dir, "ppr", f"topk_{setting}.pkl")
+            edge_index = edge_index_to_sparse_csr(edge_index, edge_map, len(node_map))
+            self.ppr_index, self.ppr_nodes, _ = ppr_topk_process(edge_index, self.sample_indexs, self.ppr_alpha,
+                                                                 self.ppr_eps, self.ppr_topk, self.num_workers,
+                                                                 file_name)
+        elif self.to_sparse:
+            edge_index = edge_index_to_sparse_csr(edge_index, edge_map)
+        else:
+            # Build the CSR once such that each sample only expands the neighbors of its frontier.
+            edge_index = edge_index_to_target_csr(edge_index, len(node_map))
         return edge_index, node_map, edge_map
 
     def __build_task__(self):
-        # edge_index, node_map, edge_map = self.__before_build_dataset__()
+        if self.lazy:
+            return MultiprocessHelper(self)
+        if (self.num_workers > 0 or self.shard_size > 0
+                or ((self.to_sparse or self.subgraph_mode == "ppr") and self.batch_size > 0)):
+            return self.__batch_build_task__()
         data_list = parallel_build_sample_process(self)
         return data_list
 
+    def __batch_build_task__(self):
+        """Build all samples with subgraphs of every chunk of samples generated together. If num_workers > 0, chunks
+        are generated by a pool of workers sharing the graph. If shard_size > 0, samples are streamed to shards.
+        """
+        edge_index, node_map, edge_map = self.__before_build_dataset__()
+        num_samples = self.sample_indexs.size(0)
+        batched = self.batch_size > 0
+        if batched:
+            chunk_size = self.batch_size
+        else:
+            chunk_size = max(1, math.ceil(num_samples / (4 * max(self.num_workers, 1))))
+        if self.shard_size > 0:
+            chunk_size = min(chunk_size, self.shard_size)
+            data_list = ShardedTaskWriter(self.shard_dir, self.shard_size)
+        else:
+            data_list = []
+        kwargs = {"hop": self.hop, "max_nodes_per_hop": self.max_nodes_per_hop, "to_sparse": self.to_sparse,
+                  "batched": batched, "ppr_scores": self.ppr_scores, "ppr_nodes": self.ppr_nodes,
+                  "ppr_index": self.ppr_index}
+        with tqdm(total=num_samples, desc="Generate task samples.") as pbar:
+            for start, subgraphs in parallel_subgraph_process(self.sample_indexs, edge_index, node_map, edge_map,
+                                                              self.num_workers, chunk_size, **kwargs):
+                for i, subgraph in enumerate(subgraphs, start):
+                    data_list.append(self.__build_sample__(self.sample_indexs[i], self.sample_labels[i],
+                                                           self.sample_label_map[i], edge_index, node_map, edge_map,
+                                                           subgraph=subgraph))
+                pbar.update(len(subgraphs))
+        if self.shard_size > 0:
+            data_list.close()
+            return ShardedTaskStore(self.shard_dir)
+        return data_list
+
 
 class TextBase():
     """Common functions used for Text-based tasks.
@@ -826,9 +1027,11 @@ class QATask(SubgraphTextTask):
             edge_index: LongTensor,
             node_map: LongTensor,
             edge_map: LongTensor,
+            subgraph: Optional[tuple] = None,
     ):
         index = value_to_tensor(index)
-        edge_index, node_map, edge_map, target_index = self.__process_graph__(index, edge_index, node_map, edge_map)
+        edge_index, node_map, edge_map, target_index = self.__process_graph__(index, edge_index, node_map, edge_map,
+                                                                              subgraph)
         # the input k index will be the first k nodes in the processed graph.
 
         target_index = value_to_tensor(target_index)
@@ -850,7 +1053,7 @@ class QATask(SubgraphTextTask):
         return self.__convert_text_to_embedding__(encoder_name, encoder, convert_features, from_saved)
 
     def __getitem__(self, item: int) -> Any:
-        data = c(self.data_list[item])
+        data = self.__get_sample__(item)
         node_map = data.node_map
         edge_map = data.edge_map
         label_map = data.label_map
@@ -1,4 +1,3 @@
-from copy import deepcopy as c
 import types
 from typing import (
     Union,
@@ -99,7 +98,7 @@ class GQATask(DefaultTextGPTask):
         return self.__convert_text_to_embedding__(encoder_name, encoder, convert_features, from_saved)
 
     def __getitem__(self, item):
-        data = c(self.data_list[item])
+        data = self.__get_sample__(item)
         node_map = data.node_map
         edge_map = data.edge_map
         label_map = data.label_map
@@ -1,5 +1,6 @@
 from typing import (
-    Union
+    Union,
+    Optional
 )
 
 import numpy as np
@@ -8,7 +9,6 @@ from torch import Tensor, LongTensor
 from TAGLAS.utils.dataset import get_split_data
 from TAGLAS.data import TAGDataset
 from ..base import SubgraphTask, DefaultTask, DefaultTextTask, SubgraphTextTask
-from ..process import subgraph_process
 
 
 def default_labels(dataset: TAGDataset, split: str) -> tuple[LongTensor, Tensor, list]:
@@ -72,10 +72,10 @@ class SubgraphLPTask(SubgraphTask):
             index: Union[int, list, Tensor],
             edge_index: LongTensor,
             node_map: Tensor,
-            edge_map: Tensor) -> tuple[LongTensor, LongTensor, LongTensor, LongTensor]:
-        edge_index, node_map, edge_map, target_index = subgraph_process(index, edge_index, node_map, edge_map,
-                                                                        self.hop, self.max_nodes_per_hop,
-                                                                        to_sparse=self.to_sparse, ppr_scores=self.ppr_scores)
+            edge_map: Tensor,
+            subgraph: Optional[tuple] = None) -> tuple[LongTensor, LongTensor, LongTensor, LongTensor]:
+        edge_index, node_map, edge_map, target_index = self.__sample_subgraph__(index, edge_index, node_map, edge_map,
+                                                                                subgraph)
 
         # remove the current training edge.
         keep_index = self.__remove_link__(edge_index[0], edge_index[1], target_index)
@@ -110,10 +110,10 @@ class SubgraphTextLPTask(SubgraphTextTask):
             index: Union[int, list, Tensor],
             edge_index: Union[LongTensor, csr_array],
             node_map: Tensor,
-            edge_map: Tensor) -> tuple[LongTensor, LongTensor, LongTensor, LongTensor]:
-        edge_index, node_map, edge_map, target_index = subgraph_process(index, edge_index, node_map, edge_map,
-                                                                        self.hop, self.max_nodes_per_hop,
-                                                                        to_sparse=self.to_sparse, ppr_scores=self.ppr_scores)
+            edge_map: Tensor,
+            subgraph: Optional[tuple] = None) -> tuple[LongTensor, LongTensor, LongTensor, LongTensor]:
+        edge_index, node_map, edge_map, target_index = self.__sample_subgraph__(index, edge_index, node_map, edge_map,
+                                                                                subgraph)
 
         # remove the current training edge.
         keep_index = self.__remove_link__(edge_index[0], edge_index[1], target_index)
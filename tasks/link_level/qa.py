@@ -1,5 +1,6 @@
 from typing import (
-    Union
+    Union,
+    Optional
 )
 
 import numpy as np
@@ -7,7 +8,6 @@ from torch import Tensor, LongTensor
 from TAGLAS.utils.dataset import get_split_data
 from TAGLAS.data import TAGDataset
 from ..base import QATask
-from ..process import subgraph_process
 
 
 def default_text_labels(dataset: TAGDataset, split: str, **kwargs) -> tuple[LongTensor, Tensor, list, list, list]:
@@ -44,10 +44,10 @@ class LQATask(QATask):
             index: Union[int, list, Tensor],
             edge_index: LongTensor,
             node_map: Tensor,
-            edge_map: Tensor) -> tuple[LongTensor, LongTensor, LongTensor, LongTensor]:
-        edge_index, node_map, edge_map, target_index = subgraph_process(index, edge_index, node_map, edge_map,
-                                                                        self.hop, self.max_nodes_per_hop,
-                                                                        to_sparse=self.to_sparse, ppr_scores=self.ppr_scores)
+            edge_map: Tensor,
+            subgraph: Optional[tuple] = None) -> tuple[LongTensor, LongTensor, LongTensor, LongTensor]:
+        edge_index, node_map, edge_map, target_index = self.__sample_subgraph__(index, edge_index, node_map, edge_map,
+                                                                                subgraph)
 
         # remove the current training edge.
         keep_index = self.__remove_link__(edge_index[0], edge_index[1], target_index)
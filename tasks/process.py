@@ -1,3 +1,8 @@
+import os
+import os.path as osp
+from collections import deque
+from contextlib import nullcontext
+from functools import partial
 from typing import (
     Union,
     Any,
@@ -12,21 +17,24 @@ from torch.utils.data import Dataset, DataLoader
 from torch_sparse import SparseTensor
 from tqdm import tqdm
 
-from TAGLAS.utils.graph import k_hop_subgraph, sample_k_hop_subgraph_sparse
-from TAGLAS.utils.io import torch_safe_save, torch_safe_load
+from TAGLAS.data import TextArray
+from TAGLAS.utils.graph import (k_hop_subgraph, sample_k_hop_subgraph_sparse, batch_sample_k_hop_subgraph_sparse,
+                                push_ppr_topk, batch_ppr_subgraph, personalized_pagerank, get_relabel_buffer)
+from TAGLAS.utils.io import (torch_safe_save, torch_safe_load, save_columnar, load_columnar, is_columnar,
+                             file_lock, load_or_save_columnar)
 
 
 def text2feature(
-        texts: Union[list[Any], np.ndarray],
+        texts: Union[list[Any], np.ndarray, TextArray],
         encoder: Any) -> Union[Tensor, list[Tensor]]:
     r"""Encode string collection to a len(data)-by-d matrix, where d is the output dimension of the LLM.
     Args:
-        texts (Union[list[Any], np.ndarray]): Collection of texts. Can be list or np.ndarray,
+        texts (Union[list[Any], np.ndarray, TextArray]): Collection of texts. Can be list, np.ndarray or TextArray,
         encoder (Any): Any module that implement an encode function for convert text to embedding.
     """
 
     if isinstance(texts[0], str):
-        if isinstance(texts, np.ndarray):
+        if isinstance(texts, (np.ndarray, TextArray)):
             return encoder.encode(texts.tolist())
         else:
             return encoder.encode(texts)
@@ -63,6 +71,30 @@ def feature_embedding_process(
     return embeddings
 
 
+def pagerank_process(
+        edge_index: Union[LongTensor, SparseTensor],
+        num_nodes: int,
+        p_vector: Optional[Tensor] = None,
+        alpha: float = 0.85,
+        file_name: str = None,
+        from_saved: bool = True) -> Tensor:
+    """Compute (personalized) PageRank scores of the graph and save the generated scores.
+    Args:
+        edge_index (Union[LongTensor, SparseTensor]): Graph.
+        num_nodes (int): Number of nodes in the graph.
+        p_vector (Tensor, optional): Personalization vector with shape [num_nodes] or [num_nodes, B].
+        alpha (float, optional): Damping factor.
+        file_name (str, optional): directory for saving and loading scores. If is None, compute scores from scratch and do not save it.
+            Scores are saved in the columnar format atomically under a file lock, so the path should be keyed by the
+            graph, like its fingerprint from :func:`TAGLAS.data.dataset.tensor_fingerprint`.
+        from_saved (bool, opitonal): If true and the file_name if provided, load saved scores if exist.
+    """
+    compute = partial(personalized_pagerank, edge_index, num_nodes, p_vector, alpha=alpha, check_interval=10)
+    if file_name is None:
+        return compute()
+    return load_or_save_columnar(file_name, compute, overwrite=not from_saved)
+
+
 def subgraph_process(
         index: Union[int, list, Tensor],
         edge_index: Union[LongTensor, SparseTensor],
@@ -72,21 +104,271 @@ def subgraph_process(
         max_nodes_per_hop: int = -1,
         num_nodes: Optional[int] = None,
         to_sparse: bool = True,
-        ppr_scores: Optional[Tensor] = None) -> tuple[LongTensor, LongTensor, LongTensor, LongTensor]:
-    """generate subgraph for the input node index.
+        ppr_scores: Optional[Tensor] = None,
+        relabel_buffer: Optional[np.ndarray] = None) -> tuple[LongTensor, LongTensor, LongTensor, LongTensor]:
+    """generate subgraph for the input node index. If to_sparse is true, relabel_buffer from get_relabel_buffer can be
+    given to be reused across calls of the same process.
     """
     if to_sparse:
         subset, processed_edge_index, mapping, processed_edge_map \
-            = sample_k_hop_subgraph_sparse(index, hop, edge_index, max_nodes_per_hop, ppr_scores)
+            = sample_k_hop_subgraph_sparse(index, hop, edge_index, max_nodes_per_hop, ppr_scores, relabel_buffer)
 
     else:
-        subset, processed_edge_index, mapping, edge_mask \
-            = k_hop_subgraph(index, hop, edge_index, max_nodes_per_hop, True, num_nodes, ppr_scores=ppr_scores)
-        processed_edge_map = edge_map[edge_mask]
+        subset, processed_edge_index, mapping, edge_id \
+            = k_hop_subgraph(index, hop, edge_index, max_nodes_per_hop, True, num_nodes, ppr_scores=ppr_scores,
+                             return_edge_id=True)
+        processed_edge_map = edge_map[edge_id]
     processed_node_map = node_map[subset]
     return processed_edge_index, processed_node_map, processed_edge_map, mapping
 
 
+def pack_subgraphs(
+        subgraphs: list[tuple[LongTensor, LongTensor, LongTensor, LongTensor]]) -> tuple[Tensor, ...]:
+    """Pack a list of subgraphs returned by subgraph_process into (node_map, node_ptr, edge_index, edge_ptr, mapping,
+    edge_map), where the i-th subgraph is given by node_map[node_ptr[i]:node_ptr[i+1]],
+    edge_index[:, edge_ptr[i]:edge_ptr[i+1]], edge_map[edge_ptr[i]:edge_ptr[i+1]] and mapping[i].
+    """
+    edge_indexs, node_maps, edge_maps, mappings = zip(*subgraphs)
+    node_ptr = torch.zeros(len(subgraphs) + 1, dtype=torch.long)
+    node_ptr[1:] = torch.cumsum(torch.tensor([len(n) for n in node_maps]), dim=0)
+    edge_ptr = torch.zeros(len(subgraphs) + 1, dtype=torch.long)
+    edge_ptr[1:] = torch.cumsum(torch.tensor([len(e) for e in edge_maps]), dim=0)
+    return (torch.cat(node_maps), node_ptr, torch.cat(edge_indexs, dim=-1), edge_ptr,
+            torch.stack([m.view(-1) for m in mappings]), torch.cat(edge_maps))
+
+
+def unpack_subgraphs(packed: tuple[Tensor, ...]) -> list[tuple[LongTensor, LongTensor, LongTensor, LongTensor]]:
+    """Split packed subgraphs from pack_subgraphs into a list of subgraphs with the same outputs as subgraph_process.
+    """
+    node_map, node_ptr, edge_index, edge_ptr, mapping, edge_map = packed
+    node_sizes = (node_ptr[1:] - node_ptr[:-1]).tolist()
+    edge_sizes = (edge_ptr[1:] - edge_ptr[:-1]).tolist()
+    processed_node_maps = torch.split(node_map, node_sizes)
+    processed_edge_indexs = torch.split(edge_index, edge_sizes, dim=-1)
+    processed_edge_maps = torch.split(edge_map, edge_sizes)
+    return list(zip(processed_edge_indexs, processed_node_maps, processed_edge_maps, mapping))
+
+
+def subgraph_chunk_process(
+        indexs: Union[list, Tensor],
+        edge_index: Union[LongTensor, SparseTensor],
+        node_map: LongTensor,
+        edge_map: LongTensor,
+        hop: int = 3,
+        max_nodes_per_hop: int = -1,
+        to_sparse: bool = True,
+        batched: bool = True,
+        ppr_scores: Optional[Tensor] = None,
+        ppr_nodes: Optional[Tensor] = None,
+        ppr_index: Optional[Tensor] = None) -> tuple[Tensor, ...]:
+    """generate subgraphs for a chunk of input indexs and return them packed in the format of pack_subgraphs. If
+    ppr_nodes is given, use the subgraphs induced by the top-k PPR neighbors, where ppr_index is the sorted nodes of
+    the rows in ppr_nodes as returned by ppr_topk_process. Otherwise, if to_sparse and batched are true, sample all
+    subgraphs at once with the batched sampler, else sample subgraph for each index separately.
+    """
+    if ppr_nodes is not None:
+        subset, node_ptr, processed_edge_index, edge_ptr, mapping, processed_edge_map \
+            = batch_ppr_subgraph(indexs, edge_index, ppr_nodes, ppr_index)
+    elif to_sparse and batched:
+        subset, node_ptr, processed_edge_index, edge_ptr, mapping, processed_edge_map \
+            = batch_sample_k_hop_subgraph_sparse(indexs, hop, edge_index, max_nodes_per_hop, ppr_scores)
+    else:
+        relabel_buffer = get_relabel_buffer(edge_index.sparse_size(0)) if to_sparse else None
+        return pack_subgraphs([subgraph_process(index, edge_index, node_map, edge_map, hop, max_nodes_per_hop,
+                                                to_sparse=to_sparse, ppr_scores=ppr_scores,
+                                                relabel_buffer=relabel_buffer) for index in indexs])
+    return node_map[subset], node_ptr, processed_edge_index, edge_ptr, mapping, processed_edge_map
+
+
+def batch_subgraph_process(
+        indexs: Union[list, Tensor],
+        edge_index: SparseTensor,
+        node_map: LongTensor,
+        hop: int = 3,
+        max_nodes_per_hop: int = -1,
+        ppr_scores: Optional[Tensor] = None) -> list[tuple[LongTensor, LongTensor, LongTensor, LongTensor]]:
+    """generate subgraphs for a batch of input node indexs at once. Return the same outputs as subgraph_process for
+    each index.
+    """
+    return unpack_subgraphs(subgraph_chunk_process(indexs, edge_index, node_map, None, hop, max_nodes_per_hop,
+                                                   ppr_scores=ppr_scores))
+
+
+def ppr_subgraph_process(
+        indexs: Union[list, Tensor],
+        edge_index: SparseTensor,
+        node_map: LongTensor,
+        ppr_nodes: Tensor,
+        ppr_index: Optional[Tensor] = None) -> list[tuple[LongTensor, LongTensor, LongTensor, LongTensor]]:
+    """generate subgraphs induced by the top-k PPR neighbors for a batch of input node indexs. Return the same outputs
+    as subgraph_process for each index.
+    """
+    return unpack_subgraphs(subgraph_chunk_process(indexs, edge_index, node_map, None, ppr_nodes=ppr_nodes,
+                                                   ppr_index=ppr_index))
+
+
+# Graph shared by all workers of parallel_subgraph_process, set once by the pool initializer.
+_worker_graph = {}
+
+
+def _init_subgraph_worker(graph: dict):
+    global _worker_graph
+    _worker_graph = graph
+    # Parallelism comes from the workers, avoid oversubscribing the cores with intra-op threads.
+    torch.set_num_threads(1)
+
+
+def _subgraph_chunk_worker(chunk: tuple[int, int, int]) -> tuple[int, tuple[np.ndarray, ...]]:
+    start, end, seed = chunk
+    torch.manual_seed(seed)
+    graph = _worker_graph
+    packed = subgraph_chunk_process(graph["indexs"][start:end], graph["edge_index"], graph["node_map"],
+                                    graph["edge_map"], **graph["kwargs"])
+    # Return plain arrays such that results are copied back through the pipe instead of opening a shared memory
+    # segment for every returned tensor.
+    return start, tuple(t.numpy() for t in packed)
+
+
+def parallel_subgraph_process(
+        indexs: Tensor,
+        edge_index: Union[LongTensor, SparseTensor],
+        node_map: LongTensor,
+        edge_map: LongTensor,
+        num_workers: int = 0,
+        chunk_size: int = 1000,
+        **kwargs):
+    """Generate subgraphs for all input indexs in contiguous chunks of chunk_size and yield (start, subgraphs) of
+    each chunk in order, where subgraphs has the same outputs as subgraph_process for each index. If num_workers > 0,
+    chunks are processed by a pool of num_workers processes sharing the graph. Every chunk is sampled with its own
+    seed, so results do not depend on num_workers given the same initial random state.
+    Args:
+        indexs (Tensor): Input indexs of all samples.
+        edge_index (Union[LongTensor, SparseTensor]): Graph.
+        node_map (LongTensor): Node map of the graph.
+        edge_map (LongTensor): Edge map of the graph.
+        num_workers (int, optional): Number of worker processes. If 0, process chunks in the main process.
+        chunk_size (int, optional): Number of samples in each chunk.
+        **kwargs: Other arguments of subgraph_chunk_process.
+    """
+    num_samples = len(indexs)
+    chunks = [(start, min(start + chunk_size, num_samples), int(torch.randint(0, 2 ** 62, (1,)).item()))
+              for start in range(0, num_samples, chunk_size)]
+    if num_workers <= 0:
+        for start, end, seed in chunks:
+            # Seed each chunk like the workers do, without changing the random state of the caller.
+            with torch.random.fork_rng(devices=[]):
+                torch.manual_seed(seed)
+                packed = subgraph_chunk_process(indexs[start:end], edge_index, node_map, edge_map, **kwargs)
+            yield start, unpack_subgraphs(packed)
+        return
+
+    graph = {"indexs": indexs, "edge_index": edge_index, "node_map": node_map, "edge_map": edge_map,
+             "kwargs": kwargs}
+    if mp.get_start_method() != "fork":
+        # Forked workers inherit the graph (including memory-mapped tensors) without copying. Otherwise, it is pickled
+        # to every worker, so place it in shared memory once.
+        for value in [indexs, edge_index, node_map, edge_map] + list(kwargs.values()):
+            if isinstance(value, (Tensor, SparseTensor)):
+                value.share_memory_()
+    with mp.Pool(num_workers, initializer=_init_subgraph_worker, initargs=(graph,)) as pool:
+        # Bound the number of chunks in flight such that finished results do not pile up in memory when the consumer
+        # is slower than the workers.
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.apply_async(_subgraph_chunk_worker, (chunk,)))
+            if len(pending) >= 2 * num_workers:
+                start, packed = pending.popleft().get()
+                yield start, unpack_subgraphs(tuple(torch.from_numpy(a) for a in packed))
+        while pending:
+            start, packed = pending.popleft().get()
+            yield start, unpack_subgraphs(tuple(torch.from_numpy(a) for a in packed))
+
+
+class PPRHelper(Dataset):
+    r"""Helper class for computing top-k PPR neighbors with pytorch dataloader multiprocess.
+    Args:
+        rowptr (np.ndarray): CSR row pointer of the graph.
+        col (np.ndarray): CSR column index of the graph.
+        nodes (np.ndarray): Seed nodes.
+        alpha (float): Damping factor of PPR.
+        eps (float): Residual threshold of the push.
+        topk (int): Number of neighbors for each seed.
+    """
+
+    def __init__(self, rowptr: np.ndarray, col: np.ndarray, nodes: np.ndarray, alpha: float, eps: float, topk: int):
+        self.rowptr = rowptr
+        self.col = col
+        self.nodes = nodes
+        self.alpha = alpha
+        self.eps = eps
+        self.topk = topk
+
+    def __getitem__(self, item):
+        return push_ppr_topk(self.rowptr, self.col, int(self.nodes[item]), self.alpha, self.eps, self.topk)
+
+    def __len__(self):
+        return len(self.nodes)
+
+
+def ppr_topk_process(
+        edge_index: SparseTensor,
+        nodes: Union[list, Tensor],
+        alpha: float = 0.85,
+        eps: float = 1e-4,
+        topk: int = 32,
+        num_workers: int = 0,
+        file_name: Optional[str] = None) -> tuple[Tensor, Tensor, Tensor]:
+    """Compute the top-k PPR neighbors of the input nodes with local push. Return the sorted computed nodes with shape
+    [M], and their neighbors and scores with shape [M, topk], padded with -1 and 0 for nodes that have less than topk
+    neighbors. Only rows of computed nodes are stored. If file_name is given, results of all computed nodes are saved
+    to file_name, and only nodes that are not in the saved file are computed.
+    Args:
+        edge_index (SparseTensor): Graph in CSR format.
+        nodes (Union[list, Tensor]): Nodes to compute.
+        alpha (float, optional): Damping factor of PPR.
+        eps (float, optional): Residual threshold of the push.
+        topk (int, optional): Number of neighbors for each node.
+        num_workers (int, optional): Number of worker for computing with multiprocess.
+        file_name (str, optional): Path for saving and loading results, should be keyed by the graph, like its
+            fingerprint from :func:`TAGLAS.data.dataset.tensor_fingerprint`.
+    """
+    # Update the saved file under a lock, such that nodes computed by concurrent processes are not lost.
+    with (file_lock(f"{file_name}.lock") if file_name is not None else nullcontext()):
+        if file_name is not None and is_columnar(file_name):
+            saved = load_columnar(file_name, mmap=False)
+            ppr_index, ppr_nodes, ppr_scores = saved["index"].numpy(), saved["nodes"].numpy(), saved["scores"].numpy()
+        else:
+            ppr_index = np.zeros(0, dtype=np.int64)
+            ppr_nodes = np.zeros((0, topk), dtype=np.int64)
+            ppr_scores = np.zeros((0, topk), dtype=np.float32)
+
+        nodes = np.setdiff1d(torch.as_tensor(nodes).long().view(-1).numpy(), ppr_index)
+        if len(nodes) > 0:
+            new_nodes = np.full((len(nodes), topk), -1, dtype=np.int64)
+            new_scores = np.zeros((len(nodes), topk), dtype=np.float32)
+            rowptr, col, _ = edge_index.csr()
+            helper = PPRHelper(rowptr.numpy(), col.numpy(), nodes, alpha, eps, topk)
+            loader = DataLoader(helper, batch_size=1000, num_workers=num_workers, shuffle=False, collate_fn=lambda x: x)
+            offset = 0
+            with tqdm(total=len(helper), desc="Compute top-k PPR neighbors.") as pbar:
+                for results in loader:
+                    for node_neighbors, node_scores in results:
+                        new_nodes[offset, :len(node_neighbors)] = node_neighbors
+                        new_scores[offset, :len(node_scores)] = node_scores
+                        offset += 1
+                    pbar.update(len(results))
+            ppr_index = np.concatenate([ppr_index, nodes])
+            order = np.argsort(ppr_index, kind="stable")
+            ppr_index = ppr_index[order]
+            ppr_nodes = np.concatenate([ppr_nodes, new_nodes])[order]
+            ppr_scores = np.concatenate([ppr_scores, new_scores])[order]
+            if file_name is not None:
+                os.makedirs(osp.dirname(file_name), exist_ok=True)
+                save_columnar({"index": torch.from_numpy(ppr_index), "nodes": torch.from_numpy(ppr_nodes),
+                               "scores": torch.from_numpy(ppr_scores)}, file_name)
+    return torch.from_numpy(ppr_index), torch.from_numpy(ppr_nodes), torch.from_numpy(ppr_scores)
+
+
 def value_to_tensor(value: Any, to_long=True):
     r"""Util function to convert all input to tensor and do the uplifting of dimension for 0-dimension tensor.
     """
@@ -139,6 +421,16 @@ class MultiprocessHelper(Dataset):
     def __len__(self):
         return self.sample_indexs.size(0)
 
+    def select(self, keep_indexs: list):
+        r"""Only keep samples in keep_indexs.
+        Args:
+            keep_indexs (list): Index of samples to keep.
+        """
+        self.sample_indexs = self.task.__sample_slice__(self.sample_indexs, keep_indexs)
+        self.sample_labels = self.task.__sample_slice__(self.sample_labels, keep_indexs)
+        self.sample_label_map = self.task.__sample_slice__(self.sample_label_map, keep_indexs)
+        return self
+
 
 def parallel_build_sample_process(task: Any, graph_level: bool = False):
     r"""Process function for building task with parallel process.
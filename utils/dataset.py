@@ -6,18 +6,61 @@ from typing import (
 )
 
 import numpy as np
+import pandas as pd
 import torch
 from torch import LongTensor, Tensor
+from torch_geometric.utils.num_nodes import maybe_num_nodes
 
-from TAGLAS.utils.graph import edge_index_to_csr_adj
+
+def sample_negative_edges(
+        edge_index: LongTensor,
+        num_samples: int,
+        num_nodes: Optional[int] = None,
+        seed: int = 3407,
+        oversample_ratio: float = 1.1) -> LongTensor:
+    r"""Sample distinct node pairs that are neither an edge in edge_index nor a self-loop, without building the dense
+    adjacency matrix. Candidate pairs are drawn in vectorized rounds as int64 keys row * num_nodes + col and rejected by
+    binary search in the sorted keys of existing edges until exactly num_samples negatives are collected. The memory
+    cost is O(num_edges + num_samples).
+    Args:
+        edge_index (LongTensor): Existing edges with shape [2, num_edges].
+        num_samples (int): Number of negative edges to sample.
+        num_nodes (int, optional): Number of nodes in the graph, inferred from edge_index if not given.
+        seed (int, optional): Random seed for the sampling.
+        oversample_ratio (float, optional): Ratio of additional candidates drawn in each round.
+    """
+    num_nodes = maybe_num_nodes(edge_index, num_nodes)
+    num_total = num_nodes * num_nodes
+    edge_keys = np.unique(edge_index[0].numpy().astype(np.int64) * num_nodes + edge_index[1].numpy())
+    num_free = num_total - num_nodes - np.count_nonzero(edge_keys // num_nodes != edge_keys % num_nodes)
+    if num_samples > num_free:
+        raise ValueError(f"Can not sample {num_samples} negative edges, only {num_free} node pairs are not connected.")
+    accept_ratio = num_free / num_total
+
+    rng = np.random.default_rng(seed)
+    sampled_keys = np.zeros(0, dtype=np.int64)
+    while len(sampled_keys) < num_samples:
+        num_draw = int((num_samples - len(sampled_keys)) * oversample_ratio / accept_ratio) + 16
+        keys = rng.integers(0, num_total, size=num_draw, dtype=np.int64)
+        # Avoid self-edge in negative sampling
+        keys = keys[keys // num_nodes != keys % num_nodes]
+        if len(edge_keys) > 0:
+            pos = np.minimum(np.searchsorted(edge_keys, keys), len(edge_keys) - 1)
+            keys = keys[edge_keys[pos] != keys]
+        sampled_keys = np.concatenate([sampled_keys, keys])
+        # Remove duplicate samples but keep the sampled order.
+        _, first_idx = np.unique(sampled_keys, return_index=True)
+        sampled_keys = sampled_keys[np.sort(first_idx)]
+    sampled_keys = sampled_keys[:num_samples]
+    return torch.from_numpy(np.stack([sampled_keys // num_nodes, sampled_keys % num_nodes], axis=0)).long()
 
 
 def generate_link_split(edge_index: LongTensor, train_ratio: float = 0.85, test_ratio: float = 0.10,
-                    labels: Optional[LongTensor] = None) -> tuple[dict, LongTensor]:
+                    labels: Optional[LongTensor] = None, seed: int = 3407) -> tuple[dict, LongTensor]:
     """Random split all links into train/val/test sets. Also sample the equal number of negative links for each split.
     Used if there is no existing split for the given dataset.
     """
-    generator = torch.manual_seed(3407)
+    generator = torch.manual_seed(seed)
     num_edges = edge_index.size(1)
     val_ratio = 1.0 - train_ratio - test_ratio
     edge_perm = torch.randperm(num_edges, generator=generator)
@@ -37,13 +80,7 @@ def generate_link_split(edge_index: LongTensor, train_ratio: float = 0.85, test_
     else:
 
         # Sample negative edges for training and testing
-        adj = edge_index_to_csr_adj(edge_index)
-        # Avoid self-edge in negative sampling
-        dense_adj = (adj.todense() + np.eye(adj.shape[0])) == 0
-        neg_row, neg_col = np.nonzero(dense_adj)
-        neg_edge_idx = np.random.permutation(len(neg_row))[: num_edges]
-        neg_row, neg_col = neg_row[neg_edge_idx], neg_col[neg_edge_idx]
-        neg_edges = torch.from_numpy(np.stack([neg_row, neg_col], axis=1).T).long()
+        neg_edges = sample_negative_edges(edge_index, num_edges, seed=seed)
         train_neg_edges, val_neg_edges, test_neg_edges = (
             neg_edges[:, :train_offset], neg_edges[:, train_offset:val_offset], neg_edges[:, val_offset:])
         train_label, val_label, test_label = (
@@ -58,11 +95,13 @@ def generate_link_split(edge_index: LongTensor, train_ratio: float = 0.85, test_
     return link_split, train_pos_idx.long()
 
 
-def generate_link_split_loop(edge_index: LongTensor, train_ratio: float = 0.85, test_ratio: float = 0.10) -> tuple[dict, LongTensor]:
+def generate_link_split_loop(edge_index: LongTensor, train_ratio: float = 0.85, test_ratio: float = 0.10,
+                             seed: int = 3407, disjoint_negative: bool = True) -> tuple[dict, LongTensor]:
     """Random split all links into train/val/test sets. Also sample the equal number of negative links for each split.
-    Used if there is no existing split for the given dataset.
+    Used if there is no existing split for the given dataset. If disjoint_negative is true, negative links are sampled
+    at once such that they are distinct across all splits, otherwise they are only distinct within each split.
     """
-    generator = torch.manual_seed(3407)
+    generator = torch.manual_seed(seed)
     num_edges = edge_index.size(1)
     val_ratio = 1.0 - train_ratio - test_ratio
     edge_perm = torch.randperm(num_edges, generator=generator)
@@ -75,14 +114,12 @@ def generate_link_split_loop(edge_index: LongTensor, train_ratio: float = 0.85,
     )
 
     # Sample negative edges for training and testing
-    adj = edge_index_to_csr_adj(edge_index)
-    n_nodes = adj.shape[0]
-    # Avoid self-edge in negative sampling
-    rand_edges = torch.randint(n_nodes, (num_edges*2, 2))
-    self_edge_mask = rand_edges[:, 0] == rand_edges[:, 1]
-    positive_mask = torch.tensor(adj[rand_edges[:,0].tolist(), rand_edges[:,1].tolist()], dtype=torch.long)
-    final_mask = torch.logical_and(torch.logical_not(self_edge_mask), torch.logical_not(positive_mask))
-    neg_edges = rand_edges[final_mask][:num_edges].T
+    if disjoint_negative:
+        neg_edges = sample_negative_edges(edge_index, num_edges, seed=seed)
+    else:
+        split_sizes = [train_offset, val_offset - train_offset, num_edges - val_offset]
+        neg_edges = torch.cat([sample_negative_edges(edge_index, size, seed=seed + i)
+                               for i, size in enumerate(split_sizes)], dim=-1)
     train_neg_edges, val_neg_edges, test_neg_edges = (
         neg_edges[:, :train_offset], neg_edges[:, train_offset:val_offset], neg_edges[:, val_offset:])
     train_label, val_label, test_label = (
@@ -97,6 +134,49 @@ def generate_link_split_loop(edge_index: LongTensor, train_ratio: float = 0.85,
     return link_split, train_pos_idx.long()
 
 
+def unique_texts_by_key(keys: Union[np.ndarray, list], key_to_text: Callable) -> tuple[list[str], np.ndarray]:
+    r"""Deduplicate texts generated from integer keys, where the text is only generated once for each unique key.
+    Return the sorted unique texts and the index of the corresponding unique text for each key.
+    Args:
+        keys (Union[np.ndarray, list]): Integer keys of all samples.
+        key_to_text (Callable): Function to generate text from a key.
+    """
+    unique_keys, key_inverse = np.unique(np.asarray(keys, dtype=np.int64), return_inverse=True)
+    texts = np.empty(len(unique_keys), dtype=object)
+    texts[:] = [key_to_text(k) for k in unique_keys.tolist()]
+    unique_texts, text_inverse = np.unique(texts, return_inverse=True)
+    return unique_texts.tolist(), text_inverse.reshape(-1)[key_inverse.reshape(-1)]
+
+
+def concat_text_columns(parts: list, fill_value: str = "missing") -> list[str]:
+    r"""Concatenate string constants and text columns element-wise to generate one text per row.
+    Args:
+        parts (list): Strings and columns (pd.Series, np.ndarray or list) to concatenate in order. At least one of them
+            must be a column, and all columns must have the same length.
+        fill_value (str, optional): Text used to replace missing values in columns. Defaults to "missing".
+    """
+    texts = None
+    for part in parts:
+        if not isinstance(part, str):
+            part = pd.Series(np.asarray(part, dtype=object)).fillna(fill_value).astype(str).to_numpy(dtype=object)
+        texts = part if texts is None else texts + part
+    if isinstance(texts, str):
+        raise ValueError("At least one text column is required.")
+    return texts.tolist()
+
+
+def ids_to_index(ids: Union[np.ndarray, list, pd.Series], id_index: Union[np.ndarray, list, pd.Index]) -> np.ndarray:
+    r"""Map raw ids to their positions in id_index with pd.Index.get_indexer.
+    Args:
+        ids (Union[np.ndarray, list, pd.Series]): Raw ids to map.
+        id_index (Union[np.ndarray, list, pd.Index]): Unique raw ids, the position of each id is its mapped index.
+    """
+    positions = pd.Index(id_index).get_indexer(np.asarray(ids))
+    if (positions < 0).any():
+        raise KeyError(f"{int((positions < 0).sum())} ids are not found in the index.")
+    return positions.astype(np.int64)
+
+
 def generate_sample_split(
         num_samples: int,
         label_map: Optional[Tensor] = None,
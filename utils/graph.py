@@ -9,7 +9,7 @@ from scipy.sparse import csr_array
 from torch import Tensor, LongTensor
 from torch_geometric.utils import to_undirected, is_undirected
 from torch_geometric.utils.num_nodes import maybe_num_nodes
-from torch_sparse import SparseTensor, coalesce
+from torch_sparse import SparseTensor
 from torch_scatter import scatter_add
 
 
@@ -33,6 +33,14 @@ def edge_index_to_sparse_csr(
         edge_attr: Optional[Tensor] = None,
         num_nodes: Optional[int] = None,
         bidirectional: bool = False) -> SparseTensor:
+    r"""Build the CSR SparseTensor of edge_index. The value of each entry is edge_attr, or the edge id in edge_index if
+    edge_attr is None, such that samplers read the edge ids from the CSR instead of allocating them in every call.
+    Args:
+        edge_index (LongTensor): Edges with shape [2, num_edges].
+        edge_attr (Tensor, optional): 1-d value of each edge, like the edge map.
+        num_nodes (int, optional): Number of nodes in the graph, inferred from edge_index if not given.
+        bidirectional (bool, optional): If true, also add the reversed edges with value -1 - edge_attr.
+    """
     N = int(edge_index.max() + 1) if num_nodes is None else num_nodes
     if edge_attr is None:
         edge_attr = torch.arange(edge_index.size(1))
@@ -58,15 +66,15 @@ def safe_to_undirected(
 
 
 def normalize_edge_index(edge_index: Union[SparseTensor, LongTensor], N: int) -> SparseTensor:
-    if isinstance(edge_index, LongTensor):
-        row, col = edge_index[0], edge_index[1]
-    else:
+    r"""Normalize each edge (i, j) by the inverse degree of j, where degree is the number of edges in each row.
+    Build a single SparseTensor, can be reused by :func:`personalized_pagerank` with normalized=True.
+    """
+    if isinstance(edge_index, SparseTensor):
         row, col, _ = edge_index.coo()
-    value = torch.ones(len(row))
-    new_edge_index = SparseTensor(row=row, col=col, value=value, sparse_sizes=(N, N))
-    degree = new_edge_index.sum(dim=1).to_dense()
-    degree_inv = torch.pow(degree, -1)
-    value = value * degree_inv[col]
+    else:
+        row, col = edge_index[0], edge_index[1]
+    degree = torch.bincount(row, minlength=N).float()
+    value = torch.pow(degree, -1)[col]
     edge_index_normalized = SparseTensor(row=row, col=col, value=value, sparse_sizes=(N, N))
     return edge_index_normalized
 
@@ -76,21 +84,37 @@ def personalized_pagerank(edge_index: Union[SparseTensor, LongTensor],
                           p_vector: Optional[Tensor] = None,
                           max_iter: int = 100,
                           tol: float = 1e-6,
-                          alpha: float = 0.85):
-    edge_index_normalized = normalize_edge_index(edge_index, num_nodes)
+                          alpha: float = 0.85,
+                          normalized: bool = False,
+                          check_interval: int = 1) -> Tensor:
+    r"""Compute (personalized) PageRank with power iteration. Multiple personalization vectors are solved at once
+    as a dense [num_nodes, B] block.
+    Args:
+        edge_index (Union[SparseTensor, LongTensor]): Graph, or the output of :func:`normalize_edge_index` if
+            normalized is true.
+        num_nodes (int): Number of nodes in the graph.
+        p_vector (Tensor, optional): Personalization vector with shape [num_nodes] or [num_nodes, B]. If None, use
+            the uniform vector.
+        max_iter (int, optional): Maximum number of iterations.
+        tol (float, optional): Stop when the L1 change of every vector is less than tol.
+        alpha (float, optional): Damping factor.
+        normalized (bool, optional): If true, edge_index is already normalized.
+        check_interval (int, optional): Check the convergence every check_interval iterations.
+    """
+    edge_index_normalized = edge_index if normalized else normalize_edge_index(edge_index, num_nodes)
     if p_vector is None:
         p_vector = torch.ones(num_nodes, dtype=torch.float)
-    p_vector = p_vector / p_vector.sum()
-    score = torch.ones(num_nodes, dtype=torch.float) / num_nodes
+    is_vector = p_vector.dim() == 1
+    p_vector = p_vector.view(num_nodes, -1).float()
+    p_vector = p_vector / p_vector.sum(dim=0, keepdim=True)
+    score = torch.ones_like(p_vector) / num_nodes
     teleport = (1 - alpha) * p_vector
-    count = 0
-    for _ in range(max_iter):
-        count += 1
-        new_score = alpha * (edge_index_normalized @ score.unsqueeze(1)).squeeze(1) + teleport
-        if torch.norm(new_score - score, p=1) < tol:
+    for i in range(max_iter):
+        new_score = alpha * (edge_index_normalized @ score) + teleport
+        if (i + 1) % check_interval == 0 and torch.norm(new_score - score, p=1, dim=0).max() < tol:
             break
         score = new_score
-    return score
+    return score.squeeze(1) if is_vector else score
 
 
 def sample_k_hop_subgraph_sparse(
@@ -99,6 +123,7 @@ def sample_k_hop_subgraph_sparse(
     edge_index: SparseTensor,
     max_nodes_per_hop: int = -1,
     ppr_scores: Optional[Tensor] = None,
+    relabel_buffer: Optional[np.ndarray] = None,
 ) -> tuple[Tensor, Tensor, Tensor, Tensor]:
     if isinstance(node_idx, int):
         node_idx = torch.tensor([node_idx])
@@ -124,32 +149,340 @@ def sample_k_hop_subgraph_sparse(
     subset, inv = torch.cat(subsets).unique(return_inverse=True)
     inv = inv[:len(node_idx)]
 
-    sub_edges = edge_index[subset, :][:, subset].coo()
-    row, col, processed_edge_map = sub_edges
-    edge_index = torch.stack([row, col], dim=0)
-
-    node_count = subset.size(0)
-    edge_index, processed_edge_map = coalesce(edge_index, processed_edge_map, node_count, node_count, "min")
+    rowptr, col, value = edge_index.csr()
+    value = None if value is None else value.numpy()
+    sub_edge_index, processed_edge_map, _ = induced_subgraph(subset.numpy(), rowptr.numpy(), col.numpy(), value,
+                                                             relabel_buffer=relabel_buffer)
+    edge_index = torch.from_numpy(sub_edge_index)
+    processed_edge_map = torch.from_numpy(processed_edge_map)
 
     return subset, edge_index, inv, processed_edge_map
 
 
+def csr_expand(rowptr: np.ndarray, nodes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    r"""Expand the CSR rows of all input nodes at once. Return the index of the input node that each expanded entry
+    comes from and the position of the entry in the CSR col/value arrays.
+    Args:
+        rowptr (np.ndarray): CSR row pointer of the graph.
+        nodes (np.ndarray): Nodes to expand, can contain duplicates.
+    """
+    start = rowptr[nodes]
+    degree = rowptr[nodes + 1] - start
+    owner = np.repeat(np.arange(len(nodes), dtype=np.int64), degree)
+    seg_start = np.cumsum(degree) - degree
+    position = np.arange(len(owner), dtype=np.int64) - seg_start[owner] + start[owner]
+    return owner, position
+
+
+def segment_random_truncate(
+        segment: np.ndarray,
+        k: int,
+        rng: np.random.Generator,
+        weight: Optional[np.ndarray] = None) -> np.ndarray:
+    r"""Randomly keep at most k entries in every segment without replacement, all segments are processed at once.
+    If weight is given, entries are kept with probability proportional to the weight. Return the mask of kept entries.
+    Args:
+        segment (np.ndarray): Segment id of each entry.
+        k (int): Maximum number of entries to keep in each segment.
+        rng (np.random.Generator): Random generator.
+        weight (np.ndarray, optional): Non-negative sampling weight of each entry.
+    """
+    priority = rng.random(len(segment))
+    if weight is not None:
+        # Efraimidis-Spirakis keys, entries with smaller keys are kept.
+        with np.errstate(divide="ignore"):
+            priority = -np.log(1.0 - priority) / weight
+    order = np.lexsort((priority, segment))
+    sorted_segment = segment[order]
+    is_start = np.ones(len(order), dtype=bool)
+    is_start[1:] = sorted_segment[1:] != sorted_segment[:-1]
+    start_pos = np.flatnonzero(is_start)
+    rank = np.arange(len(order)) - np.repeat(start_pos, np.diff(np.append(start_pos, len(order))))
+    keep = np.zeros(len(segment), dtype=bool)
+    keep[order[rank < k]] = True
+    return keep
+
+
+def get_relabel_buffer(num_nodes: int, buffer: Optional[np.ndarray] = None) -> np.ndarray:
+    r"""Return a relabel buffer for :func:`induced_subgraph` with at least num_nodes int64 entries, all set to -1.
+    The given buffer is returned if it is large enough, otherwise a new one is allocated. The caller owns the buffer
+    and should reuse it across calls in the same process or thread, as every call restores it to -1 before return.
+    Args:
+        num_nodes (int): Number of nodes in the graph.
+        buffer (np.ndarray, optional): Buffer returned by a previous call.
+    """
+    if buffer is not None and len(buffer) >= num_nodes:
+        return buffer
+    return np.full(num_nodes, -1, dtype=np.int64)
+
+
+def induced_subgraph(
+        subset: np.ndarray,
+        rowptr: np.ndarray,
+        col: np.ndarray,
+        value: Optional[np.ndarray],
+        node_ptr: Optional[np.ndarray] = None,
+        remove_duplicates: bool = True,
+        relabel_buffer: Optional[np.ndarray] = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    r"""Extract the induced subgraph of subset from the CSR arrays by walking only the rows of nodes in subset.
+    If relabel_buffer is given and subset is a single subgraph, column membership is tested with the relabel buffer.
+    Otherwise, it is tested by binary search in the sorted (sample, node) keys, which needs no buffer over all nodes. Return the relabeled edge_index with
+    shape [2, num_edges], the value of each edge and the edge offsets with shape [B + 1].
+    Args:
+        subset (np.ndarray): Sorted nodes of the subgraph, or packed sorted nodes of B subgraphs if node_ptr is given.
+        rowptr (np.ndarray): CSR row pointer of the graph.
+        col (np.ndarray): CSR column index of the graph.
+        value (np.ndarray, optional): CSR value of the graph, returned as the value of each extracted edge. If None,
+            the CSR position of each edge is returned instead.
+        node_ptr (np.ndarray, optional): Node offsets of B subgraphs with shape [B + 1].
+        remove_duplicates (bool, optional): If true, keep only the edge with the minimum value among duplicated edges
+            and sort edges by (row, col), like coalesce with "min". Otherwise, keep all edges in the CSR order.
+        relabel_buffer (np.ndarray, optional): Buffer from :func:`get_relabel_buffer` for the graph.
+    """
+    num_nodes = len(rowptr) - 1
+    if node_ptr is None:
+        node_ptr = np.array([0, len(subset)], dtype=np.int64)
+    num_samples = len(node_ptr) - 1
+    sample = np.repeat(np.arange(num_samples, dtype=np.int64), np.diff(node_ptr))
+    owner, position = csr_expand(rowptr, subset)
+    if num_samples == 1 and relabel_buffer is not None:
+        relabel_buffer[subset] = np.arange(len(subset))
+        target = relabel_buffer[col[position]]
+        relabel_buffer[subset] = -1
+    else:
+        subset_keys = sample * num_nodes + subset
+        target_keys = sample[owner] * num_nodes + col[position]
+        target = np.minimum(np.searchsorted(subset_keys, target_keys), len(subset_keys) - 1)
+        target[subset_keys[target] != target_keys] = -1
+
+    mask = target >= 0
+    row, target, edge_value = owner[mask], target[mask], position[mask]
+    if value is not None:
+        edge_value = value[edge_value]
+    if remove_duplicates:
+        order = np.lexsort((edge_value, target, row))
+        row, target, edge_value = row[order], target[order], edge_value[order]
+        mask = np.ones(len(row), dtype=bool)
+        mask[1:] = (row[1:] != row[:-1]) | (target[1:] != target[:-1])
+        row, target, edge_value = row[mask], target[mask], edge_value[mask]
+    edge_sample = sample[row]
+    edge_ptr = np.zeros(num_samples + 1, dtype=np.int64)
+    edge_ptr[1:] = np.cumsum(np.bincount(edge_sample, minlength=num_samples))
+    return np.stack([row, target]) - node_ptr[edge_sample], edge_value, edge_ptr
+
+
+def batch_sample_k_hop_subgraph_sparse(
+        node_idx: Union[list, Tensor],
+        num_hops: int,
+        edge_index: SparseTensor,
+        max_nodes_per_hop: int = -1,
+        ppr_scores: Optional[Tensor] = None,
+        seed: Optional[int] = None,
+) -> tuple[Tensor, Tensor, Tensor, Tensor, Tensor, Tensor]:
+    r"""Batched version of :func:`sample_k_hop_subgraph_sparse`. Sample the k-hop subgraphs of B seed sets at once by
+    expanding the frontiers of all samples together over the CSR arrays, with segment-wise random truncation of each
+    hop. Results of all samples are packed and the i-th sample is given by subset[node_ptr[i]:node_ptr[i+1]],
+    edge_index[:, edge_ptr[i]:edge_ptr[i+1]], mapping[i] and edge_map[edge_ptr[i]:edge_ptr[i+1]].
+    Args:
+        node_idx (Union[list, Tensor]): Seed nodes with shape [B] or [B, num_seeds].
+        num_hops (int): Number of hops.
+        edge_index (SparseTensor): Graph in CSR format, the value of each edge is returned as edge_map.
+        max_nodes_per_hop (int, optional): If larger than 0, keep at most max_nodes_per_hop nodes in each hop.
+        ppr_scores (Tensor, optional): If given, nodes in each hop are kept with probability proportional to the score.
+        seed (int, optional): Random seed for truncation. If None, it is drawn from the torch random generator.
+    Return:
+        subset (Tensor): Packed global node index of all subgraphs, sorted within each subgraph.
+        node_ptr (Tensor): Node offsets with shape [B + 1].
+        edge_index (Tensor): Packed local edge index of all subgraphs with shape [2, num_edges].
+        edge_ptr (Tensor): Edge offsets with shape [B + 1].
+        mapping (Tensor): Local index of the seed nodes with shape [B, num_seeds].
+        edge_map (Tensor): Packed edge value of all subgraphs.
+    """
+    assert isinstance(edge_index, SparseTensor)
+    seeds = torch.as_tensor(node_idx).long()
+    seeds = seeds.view(seeds.size(0), -1).numpy()
+    rowptr, col, value = edge_index.csr()
+    rowptr, col = rowptr.numpy(), col.numpy()
+    value = None if value is None else value.numpy()
+    weight = None if ppr_scores is None else ppr_scores.numpy()
+    if seed is None:
+        seed = int(torch.randint(0, 2 ** 62, (1,)).item())
+    rng = np.random.default_rng(seed)
+    num_nodes = edge_index.sparse_size(0)
+    num_samples, num_seeds = seeds.shape
+
+    # Every (sample, node) pair is represented by the int64 key sample * num_nodes + node.
+    seed_keys = (np.arange(num_samples, dtype=np.int64)[:, None] * num_nodes + seeds).reshape(-1)
+    frontier = np.unique(seed_keys)
+    keys = [seed_keys]
+    for _ in range(num_hops):
+        owner, position = csr_expand(rowptr, frontier % num_nodes)
+        # Like sample_adj, the nodes in the frontier are included in the next hop.
+        candidate = np.unique(np.concatenate([frontier, frontier[owner] // num_nodes * num_nodes + col[position]]))
+        if max_nodes_per_hop > 0:
+            candidate = candidate[segment_random_truncate(
+                candidate // num_nodes, max_nodes_per_hop, rng,
+                None if weight is None else weight[candidate % num_nodes])]
+        keys.append(candidate)
+        frontier = candidate
+
+    subset_keys = np.unique(np.concatenate(keys))
+    sample, subset = np.divmod(subset_keys, num_nodes)
+    node_ptr = np.zeros(num_samples + 1, dtype=np.int64)
+    node_ptr[1:] = np.cumsum(np.bincount(sample, minlength=num_samples))
+    mapping = (np.searchsorted(subset_keys, seed_keys) - node_ptr[seed_keys // num_nodes]).reshape(num_samples,
+                                                                                                    num_seeds)
+
+    # Induce edges of each subgraph and keep the minimum value for duplicated edges.
+    sub_edge_index, edge_value, edge_ptr = induced_subgraph(subset, rowptr, col, value, node_ptr)
+
+    return (torch.from_numpy(subset), torch.from_numpy(node_ptr), torch.from_numpy(sub_edge_index),
+            torch.from_numpy(edge_ptr), torch.from_numpy(mapping), torch.from_numpy(edge_value))
+
+
+def push_ppr_topk(
+        rowptr: np.ndarray,
+        col: np.ndarray,
+        node: int,
+        alpha: float = 0.85,
+        eps: float = 1e-4,
+        topk: int = 32) -> tuple[np.ndarray, np.ndarray]:
+    r"""Approximate personalized PageRank of a single seed node with the Andersen-Chung-Lang local push and return
+    the top-k nodes and their scores in descending order. Only nodes with residual larger than eps times their
+    degree are pushed, so the cost is bounded by O(1 / ((1 - alpha) * eps)) instead of the size of the graph.
+    Args:
+        rowptr (np.ndarray): CSR row pointer of the graph.
+        col (np.ndarray): CSR column index of the graph.
+        node (int): Seed node.
+        alpha (float, optional): Damping factor, the teleport probability is 1 - alpha. Same as
+            :func:`personalized_pagerank`.
+        eps (float, optional): Residual threshold of the push.
+        topk (int, optional): Number of nodes to return.
+    """
+    teleport = 1.0 - alpha
+    p = {}
+    r = {node: teleport}
+    queue = [node]
+    in_queue = {node}
+    while queue:
+        u = queue.pop()
+        in_queue.discard(u)
+        res = r.pop(u, 0.0)
+        p[u] = p.get(u, 0.0) + res
+        start, end = int(rowptr[u]), int(rowptr[u + 1])
+        if end == start:
+            continue
+        value = alpha * res / (end - start)
+        for v in col[start:end].tolist():
+            r[v] = r.get(v, 0.0) + value
+            if v not in in_queue and r[v] >= teleport * eps * (rowptr[v + 1] - rowptr[v]):
+                queue.append(v)
+                in_queue.add(v)
+
+    nodes = np.fromiter(p.keys(), dtype=np.int64, count=len(p))
+    scores = np.fromiter(p.values(), dtype=np.float64, count=len(p))
+    order = np.argsort(-scores, kind="stable")[:topk]
+    return nodes[order], scores[order]
+
+
+def batch_ppr_subgraph(
+        node_idx: Union[list, Tensor],
+        edge_index: SparseTensor,
+        ppr_nodes: Tensor,
+        ppr_index: Optional[Tensor] = None,
+) -> tuple[Tensor, Tensor, Tensor, Tensor, Tensor, Tensor]:
+    r"""Build the subgraphs of B seed sets from the top-k PPR neighbors of the seeds instead of the hop expansion. The
+    subgraph of each sample is induced by the seeds and the union of their top-k PPR neighbors. Return the same packed
+    outputs as :func:`batch_sample_k_hop_subgraph_sparse`.
+    Args:
+        node_idx (Union[list, Tensor]): Seed nodes with shape [B] or [B, num_seeds].
+        edge_index (SparseTensor): Graph in CSR format, the value of each edge is returned as edge_map.
+        ppr_nodes (Tensor): Top-k PPR neighbors with shape [M, k], padded with -1. The i-th row is the neighbors of
+            node ppr_index[i], or of node i if ppr_index is None.
+        ppr_index (Tensor, optional): Sorted nodes of the rows in ppr_nodes with shape [M].
+    """
+    assert isinstance(edge_index, SparseTensor)
+    seeds = torch.as_tensor(node_idx).long()
+    seeds = seeds.view(seeds.size(0), -1).numpy()
+    rowptr, col, value = edge_index.csr()
+    rowptr, col = rowptr.numpy(), col.numpy()
+    value = None if value is None else value.numpy()
+    num_nodes = edge_index.sparse_size(0)
+    num_samples, num_seeds = seeds.shape
+
+    seed_keys = (np.arange(num_samples, dtype=np.int64)[:, None] * num_nodes + seeds).reshape(-1)
+    rows = seeds.reshape(-1)
+    if ppr_index is not None:
+        ppr_index = ppr_index.numpy()
+        if not np.isin(rows, ppr_index).all():
+            raise ValueError("Top-k PPR neighbors of some seed nodes are not computed.")
+        rows = np.searchsorted(ppr_index, rows)
+    neighbors = ppr_nodes.numpy()[rows]
+    neighbor_keys = np.repeat(seed_keys // num_nodes, neighbors.shape[1]) * num_nodes + neighbors.reshape(-1)
+    subset_keys = np.unique(np.concatenate([seed_keys, neighbor_keys[neighbors.reshape(-1) >= 0]]))
+    sample, subset = np.divmod(subset_keys, num_nodes)
+    node_ptr = np.zeros(num_samples + 1, dtype=np.int64)
+    node_ptr[1:] = np.cumsum(np.bincount(sample, minlength=num_samples))
+    mapping = (np.searchsorted(subset_keys, seed_keys) - node_ptr[seed_keys // num_nodes]).reshape(num_samples,
+                                                                                                    num_seeds)
+    sub_edge_index, edge_value, edge_ptr = induced_subgraph(subset, rowptr, col, value, node_ptr)
+
+    return (torch.from_numpy(subset), torch.from_numpy(node_ptr), torch.from_numpy(sub_edge_index),
+            torch.from_numpy(edge_ptr), torch.from_numpy(mapping), torch.from_numpy(edge_value))
+
+
+def edge_index_to_target_csr(
+        edge_index: LongTensor,
+        num_nodes: Optional[int] = None) -> SparseTensor:
+    r"""Build the CSR of edge_index indexed by the target node, where the col of each entry is the source node and the
+    value is the edge id in edge_index. Used by :func:`k_hop_subgraph` to expand frontiers along incoming edges.
+    Args:
+        edge_index (LongTensor): Edges with shape [2, num_edges].
+        num_nodes (int, optional): Number of nodes in the graph, inferred from edge_index if not given.
+    """
+    N = maybe_num_nodes(edge_index, num_nodes)
+    return SparseTensor(row=edge_index[1], col=edge_index[0], value=torch.arange(edge_index.size(1)),
+                        sparse_sizes=(N, N))
+
+
 def k_hop_subgraph(
         node_idx: Union[int, list[int], Tensor],
         num_hops: int,
-        edge_index: Tensor,
+        edge_index: Union[Tensor, SparseTensor],
         max_nodes_per_hop=-1,
         relabel_nodes: bool = False,
         num_nodes: Optional[int] = None,
         directed: bool = False,
         ppr_scores: Optional[Tensor] = None,
+        return_edge_id: bool = False,
 ) -> tuple[Tensor, Tensor, Tensor, Tensor]:
-    num_nodes = maybe_num_nodes(edge_index, num_nodes)
-
-    col, row = edge_index
-
-    node_mask = row.new_empty(num_nodes, dtype=torch.bool)
-    edge_mask = row.new_empty(row.size(0), dtype=torch.bool)
+    r"""Extract the k-hop subgraph around node_idx, where each hop contains the source nodes of the incoming edges of
+    the previous hop. Frontiers are expanded over the CSR of incoming edges, so the cost scales with the size of the
+    subgraph instead of the size of the graph. Pass the CSR from :func:`edge_index_to_target_csr` as edge_index to
+    avoid rebuilding it in every call.
+    Args:
+        node_idx (Union[int, list[int], Tensor]): Target nodes.
+        num_hops (int): Number of hops.
+        edge_index (Union[Tensor, SparseTensor]): Edges with shape [2, num_edges] or their target CSR.
+        max_nodes_per_hop (int, optional): If larger than 0, keep at most max_nodes_per_hop nodes in each hop.
+        relabel_nodes (bool, optional): If true, relabel nodes in the returned edge_index to local index.
+        num_nodes (int, optional): Number of nodes in the graph.
+        directed (bool, optional): If true, only return the incoming edges of the last hop.
+        ppr_scores (Tensor, optional): If given, nodes in each hop are kept with probability proportional to the score.
+        return_edge_id (bool, optional): If true, return the index of the returned edges instead of the edge mask,
+            which avoids allocating a mask over all edges in every call.
+    Return:
+        subset (Tensor): Sorted global index of nodes in the subgraph.
+        edge_index (Tensor): Edges of the subgraph, ordered as in the input edge_index. If relabel_nodes is true,
+            nodes outside the subset (only possible when directed is true) are mapped to -1.
+        mapping (Tensor): Local index of node_idx in the subgraph.
+        edge_mask (Tensor): Boolean mask of the returned edges in the input edge_index, or their sorted index if
+            return_edge_id is true.
+    """
+    if not isinstance(edge_index, SparseTensor):
+        edge_index = edge_index_to_target_csr(edge_index, num_nodes)
+    rowptr, col, value = edge_index.csr()
+    rowptr, col, value = rowptr.numpy(), col.numpy(), value.numpy()
 
     if isinstance(node_idx, int):
         node_idx = [node_idx]
@@ -160,39 +493,44 @@ def k_hop_subgraph(
             node_idx = node_idx.tolist()
 
     subsets = []
-
+    position = np.zeros(0, dtype=np.int64)
     for node in node_idx:
-        subsets.append(torch.tensor([node], device=row.device))
+        subsets.append(np.array([node], dtype=np.int64))
         for _ in range(num_hops):
-            node_mask.fill_(False)
-            node_mask[subsets[-1]] = True
-            torch.index_select(node_mask, 0, row, out=edge_mask)
-            fringe = col[edge_mask]
+            _, position = csr_expand(rowptr, np.unique(subsets[-1]))
+            fringe = col[position]
             if max_nodes_per_hop > 0:
                 if len(fringe) > max_nodes_per_hop:
                     if ppr_scores is None:
-                        fringe = fringe[torch.randperm(len(fringe))[:max_nodes_per_hop]]
+                        fringe = fringe[torch.randperm(len(fringe))[:max_nodes_per_hop].numpy()]
                     else:
-                        neighbor_prob_vector = ppr_scores[fringe]
+                        neighbor_prob_vector = ppr_scores[torch.from_numpy(fringe)]
                         neighbor_prob_vector = neighbor_prob_vector / neighbor_prob_vector.sum()
                         fringe = fringe[torch.multinomial(neighbor_prob_vector, num_samples=max_nodes_per_hop,
-                                                          replacement=False)]
+                                                          replacement=False).numpy()]
             subsets.append(fringe)
 
-    subset, inv = torch.cat(subsets).unique(return_inverse=True)
-    inv = inv[:len(node_idx)]
-
-    node_mask.fill_(False)
-    node_mask[subset] = True
+    subset = np.unique(np.concatenate(subsets))
+    inv = np.searchsorted(subset, np.array(node_idx, dtype=np.int64))
 
     if not directed:
-        edge_mask = node_mask[row] & node_mask[col]
-
-    edge_index = edge_index[:, edge_mask]
+        sub_edge_index, edge_id, _ = induced_subgraph(subset, rowptr, col, value, remove_duplicates=False)
+        order = np.argsort(edge_id, kind="stable")
+        edge_id = edge_id[order]
+        edge_index = subset[sub_edge_index[::-1, order]]
+    else:
+        target = np.searchsorted(rowptr, position, side="right") - 1
+        order = np.argsort(value[position], kind="stable")
+        edge_id = value[position][order]
+        edge_index = np.stack([col[position][order], target[order]])
 
     if relabel_nodes:
-        mapping = row.new_full((num_nodes,), -1)
-        mapping[subset] = torch.arange(subset.size(0), device=row.device)
-        edge_index = mapping[edge_index]
+        local = np.minimum(np.searchsorted(subset, edge_index), len(subset) - 1)
+        edge_index = np.where(subset[local] == edge_index, local, -1)
+
+    if not return_edge_id:
+        edge_mask = np.zeros(len(col), dtype=bool)
+        edge_mask[edge_id] = True
+        edge_id = edge_mask
 
-    return subset, edge_index, inv, edge_mask
+    return torch.from_numpy(subset), torch.from_numpy(edge_index), torch.from_numpy(inv), torch.from_numpy(edge_id)
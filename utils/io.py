@@ -1,20 +1,33 @@
+import copy
+import fcntl
+import glob
 import os
 import os.path as osp
 import shutil
+import uuid
 import zipfile
+from collections import UserDict
+from contextlib import contextmanager
 from typing import (
     Any,
+    Callable,
+    Iterator,
     Optional,
     Union,
 )
 
 import fsspec
+import numpy as np
 import torch
-from torch_geometric.data import download_url
+from torch import Tensor
+from torch_geometric.data import Data, download_url
 from huggingface_hub import hf_hub_download
 import io
+import json
 import shutil
 from TAGLAS.constants import ROOT
+from TAGLAS.data.text_array import TextArray, TextArrayWriter
+from TAGLAS.data.task_store import PackedTaskStore
 
 
 def torch_safe_save(obj: Any, path: str) -> None:
@@ -32,6 +45,352 @@ def torch_safe_load(path: str, map_location: Any = None) -> Any:
     return None
 
 
+class ColumnRef:
+    r"""Placeholder for a tensor stored in its own file by :func:`save_columnar`.
+    Args:
+        name (str): Name of the column file (without suffix) in the column directory.
+    """
+
+    __slots__ = ("name",)
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+
+class TextColumnRef(ColumnRef):
+    r"""Placeholder for a :class:`TextArray` stored in its own buffer files by :func:`save_columnar`.
+    Args:
+        name (str): Name prefix of the buffer files in the column directory.
+    """
+
+    __slots__ = ()
+
+
+def column_dir_of(path: str) -> str:
+    r"""Return the directory that holds the columns of the columnar file saved at path by earlier versions. Newly
+    saved files keep their columns in a versioned directory recorded in the skeleton, see :func:`save_columnar`."""
+    return osp.splitext(path)[0] + "_columns"
+
+
+class ColumnarSkeleton:
+    r"""Pickled content of a columnar file, the object with :class:`ColumnRef` placeholders and the name of the
+    versioned directory holding its columns.
+    Args:
+        obj (Any): Object with column placeholders.
+        column_dir (str): Name of the column directory, relative to the directory of the file.
+    """
+
+    __slots__ = ("obj", "column_dir")
+
+    def __init__(self, obj: Any, column_dir: str) -> None:
+        self.obj = obj
+        self.column_dir = column_dir
+
+
+def _column_versions(path: str) -> list[str]:
+    # Completely written column directories of path, unfinished ones end with .tmp.
+    pattern = glob.escape(column_dir_of(path)) + ".*"
+    return [d for d in glob.glob(pattern) if not d.endswith(".tmp")]
+
+
+def _new_column_dir(path: str) -> str:
+    os.makedirs(osp.dirname(osp.abspath(path)), exist_ok=True)
+    column_dir = f"{column_dir_of(path)}.{os.getpid()}_{uuid.uuid4().hex[:8]}.tmp"
+    os.makedirs(column_dir)
+    return column_dir
+
+
+def _publish_columnar(skeleton: Any, path: str, tmp_column_dir: str) -> None:
+    # Rename the finished column directory, then replace the skeleton with a single atomic rename such that readers
+    # always see either the complete old file or the complete new one. Stale versions are removed afterwards.
+    column_dir = tmp_column_dir[:-len(".tmp")]
+    os.replace(tmp_column_dir, column_dir)
+    tmp_path = f"{column_dir}.skeleton.tmp"
+    torch.save(ColumnarSkeleton(skeleton, osp.basename(column_dir)), tmp_path, pickle_protocol=4)
+    os.replace(tmp_path, path)
+    for stale_dir in _column_versions(path) + [column_dir_of(path)]:
+        if stale_dir != column_dir:
+            shutil.rmtree(stale_dir, ignore_errors=True)
+
+
+def remove_columnar(path: str) -> None:
+    r"""Remove the columnar file at path together with all its columns."""
+    if osp.exists(path):
+        os.remove(path)
+    for column_dir in _column_versions(path) + [column_dir_of(path)]:
+        shutil.rmtree(column_dir, ignore_errors=True)
+
+
+@contextmanager
+def file_lock(path: str) -> Iterator[None]:
+    r"""Exclusive inter-process lock on the file at path. Used to make sure a processed file shared by multiple
+    processes (like the ranks of distributed training) is generated only once.
+    Args:
+        path (str): Path of the lock file.
+    """
+    os.makedirs(osp.dirname(osp.abspath(path)), exist_ok=True)
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _to_columns(obj: Any, name: str, column_dir: str) -> Any:
+    if isinstance(obj, TextArray):
+        obj.save(osp.join(column_dir, name))
+        return TextColumnRef(name)
+    elif isinstance(obj, Tensor):
+        if obj.numel() == 0 or obj.dtype == torch.bfloat16:
+            return obj
+        np.save(osp.join(column_dir, f"{name}.npy"), obj.detach().cpu().contiguous().numpy())
+        return ColumnRef(name)
+    elif isinstance(obj, PackedTaskStore):
+        # Offsets are saved as tensor columns and restored to np.ndarray in loading.
+        ptrs = {key: torch.from_numpy(ptr) for key, ptr in obj.ptrs.items()}
+        return PackedTaskStore(_to_columns(obj.values, f"{name}.values", column_dir),
+                               _to_columns(ptrs, f"{name}.ptrs", column_dir), dict(obj.cat_dims))
+    elif isinstance(obj, Data):
+        skeleton = copy.copy(obj)
+        for key, value in list(obj._store.items()):
+            skeleton[key] = _to_columns(value, f"{name}.{key}", column_dir)
+        return skeleton
+    elif isinstance(obj, (dict, UserDict)):
+        skeleton = copy.copy(obj)
+        for key, value in obj.items():
+            skeleton[key] = _to_columns(value, f"{name}.{key}", column_dir)
+        return skeleton
+    elif isinstance(obj, (list, tuple)) and any(isinstance(v, (Tensor, TextArray, Data, dict, UserDict)) for v in obj):
+        values = [_to_columns(v, f"{name}.{i}", column_dir) for i, v in enumerate(obj)]
+        return type(obj)(values) if isinstance(obj, list) else tuple(values)
+    else:
+        return obj
+
+
+def _from_columns(obj: Any, column_dir: str, mmap: bool = True) -> Any:
+    if isinstance(obj, TextColumnRef):
+        return TextArray.load(osp.join(column_dir, obj.name), mmap)
+    elif isinstance(obj, ColumnRef):
+        array = np.load(osp.join(column_dir, f"{obj.name}.npy"), mmap_mode=("c" if mmap else None))
+        return torch.from_numpy(array)
+    elif isinstance(obj, PackedTaskStore):
+        values = _from_columns(obj.values, column_dir, mmap)
+        ptrs = {key: ptr.numpy() for key, ptr in _from_columns(obj.ptrs, column_dir, mmap).items()}
+        return PackedTaskStore(values, ptrs, obj.cat_dims)
+    elif isinstance(obj, Data):
+        for key, value in list(obj._store.items()):
+            obj[key] = _from_columns(value, column_dir, mmap)
+        return obj
+    elif isinstance(obj, (dict, UserDict)):
+        for key, value in list(obj.items()):
+            obj[key] = _from_columns(value, column_dir, mmap)
+        return obj
+    elif isinstance(obj, list):
+        return [_from_columns(v, column_dir, mmap) for v in obj]
+    elif isinstance(obj, tuple):
+        return tuple(_from_columns(v, column_dir, mmap) for v in obj)
+    else:
+        return obj
+
+
+def save_columnar(obj: Any, path: str) -> None:
+    r"""Save obj in the columnar processed format. Every non-empty tensor inside obj (including tensors nested in
+    TAGData, dict, BaseDict, list, tuple and :class:`PackedTaskStore`) is written to its own raw .npy file in a new
+    versioned column directory, every :class:`TextArray` is written as its byte buffer and offsets, and the remaining
+    structure with :class:`ColumnRef` placeholders is pickled to path. The file is replaced atomically, so a crash or
+    a concurrent reader never sees a partially written file.
+    Args:
+        obj (Any): Object to save.
+        path (str): Path of the pickled skeleton.
+    """
+    column_dir = _new_column_dir(path)
+    skeleton = _to_columns(obj, "obj", column_dir)
+    _publish_columnar(skeleton, path, column_dir)
+
+
+class ColumnarTextWriter(TextArrayWriter):
+    r"""Incrementally write texts to path in the columnar format. The saved file is loaded by :func:`load_columnar`
+    as a :class:`TextArray`, same as saving a TextArray with :func:`save_columnar`.
+    Args:
+        path (str): Path of the pickled skeleton.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.column_dir = _new_column_dir(path)
+        super().__init__(osp.join(self.column_dir, "obj"))
+        self.skeleton_path = path
+
+    def close(self) -> None:
+        super().close()
+        _publish_columnar(TextColumnRef("obj"), self.skeleton_path, self.column_dir)
+
+
+def load_columnar(path: str, mmap: bool = True) -> Any:
+    r"""Load object saved by :func:`save_columnar`. Tensors are opened as copy-on-write memory maps, so opening is
+    close to constant time and all processes reading the same file share the page cache. Files saved by plain
+    torch.save are loaded as before.
+    Args:
+        path (str): Path of the saved file.
+        mmap (bool, optional): If false, read all columns into memory instead of memory-mapping them.
+    """
+    obj = torch.load(path)
+    if isinstance(obj, ColumnarSkeleton):
+        return _from_columns(obj.obj, osp.join(osp.dirname(path), obj.column_dir), mmap)
+    column_dir = column_dir_of(path)
+    if osp.isdir(column_dir):
+        obj = _from_columns(obj, column_dir, mmap)
+    return obj
+
+
+def is_columnar(path: str) -> bool:
+    r"""Return true if the file at path is saved by :func:`save_columnar`."""
+    return osp.exists(path) and (osp.isdir(column_dir_of(path)) or len(_column_versions(path)) > 0)
+
+
+def load_or_save_columnar(path: str, build_func: Callable[[], Any], overwrite: bool = False,
+                          mmap: bool = True) -> Any:
+    r"""Load the columnar file at path. If it does not exist or overwrite is true, generate the object with
+    build_func and save it first. Generation is done under a file lock, so concurrent processes generate the file
+    only once and wait for it instead of reading a partially written one.
+    Args:
+        path (str): Path of the columnar file.
+        build_func (Callable[[], Any]): Function to generate the object.
+        overwrite (bool, optional): If true, regenerate the file even if it exists.
+        mmap (bool, optional): If false, read all columns into memory instead of memory-mapping them.
+    """
+    if overwrite or not is_columnar(path):
+        with file_lock(f"{path}.lock"):
+            # Another process may have generated the file while waiting for the lock.
+            if overwrite or not is_columnar(path):
+                save_columnar(build_func(), path)
+    return load_columnar(path, mmap)
+
+
+class ShardedTaskWriter:
+    r"""Incrementally write task samples to numbered shards with at most shard_size samples. Each shard is a
+    :class:`PackedTaskStore` saved by :func:`save_columnar`, and a manifest with the number of samples in every shard
+    is written when closed. Only the samples of the current shard are kept in memory.
+    Args:
+        shard_dir (str): Directory of the shards, existing shards in it are removed.
+        shard_size (int): Number of samples in each shard.
+    """
+
+    def __init__(self, shard_dir: str, shard_size: int) -> None:
+        if osp.isdir(shard_dir):
+            shutil.rmtree(shard_dir)
+        os.makedirs(shard_dir)
+        self.shard_dir = shard_dir
+        self.shard_size = shard_size
+        self.buffer = []
+        self.shards = []
+
+    def append(self, data: Data) -> None:
+        self.buffer.append(data)
+        if len(self.buffer) >= self.shard_size:
+            self.flush()
+
+    def flush(self) -> None:
+        r"""Write buffered samples to a new shard."""
+        if len(self.buffer) == 0:
+            return
+        file_name = f"shard_{len(self.shards):05d}.pkl"
+        save_columnar(PackedTaskStore.from_list(self.buffer), osp.join(self.shard_dir, file_name))
+        self.shards.append({"file": file_name, "num_samples": len(self.buffer)})
+        self.buffer = []
+
+    def close(self) -> None:
+        r"""Write remaining samples and the manifest. The shards are only readable by :class:`ShardedTaskStore`
+        after closing."""
+        self.flush()
+        manifest = {"num_samples": sum(shard["num_samples"] for shard in self.shards),
+                    "shard_size": self.shard_size,
+                    "shards": self.shards}
+        with open(osp.join(self.shard_dir, ShardedTaskStore.manifest_name), "w") as f:
+            json.dump(manifest, f, indent=1)
+
+
+class ShardedTaskStore:
+    r"""Read-only list of task samples saved by :class:`ShardedTaskWriter`. Samples are indexed across shards by the
+    per-shard counts in the manifest, and each shard is memory-mapped when it is first accessed.
+    Args:
+        shard_dir (str): Directory of the shards and the manifest.
+    """
+
+    manifest_name = "manifest.json"
+
+    def __init__(self, shard_dir: str) -> None:
+        with open(osp.join(shard_dir, self.manifest_name)) as f:
+            manifest = json.load(f)
+        self.shard_dir = shard_dir
+        self.shard_files = [shard["file"] for shard in manifest["shards"]]
+        self.shard_ptr = np.zeros(len(self.shard_files) + 1, dtype=np.int64)
+        np.cumsum([shard["num_samples"] for shard in manifest["shards"]], out=self.shard_ptr[1:])
+        self._shards = {}
+
+    @classmethod
+    def exists(cls, shard_dir: str) -> bool:
+        r"""Return true if shard_dir contains completely written shards."""
+        return osp.exists(osp.join(shard_dir, cls.manifest_name))
+
+    @property
+    def num_shards(self) -> int:
+        return len(self.shard_files)
+
+    def shard(self, shard_idx: int) -> PackedTaskStore:
+        r"""Return the memory-mapped shard.
+        Args:
+            shard_idx (int): Index of the shard.
+        """
+        if shard_idx not in self._shards:
+            self._shards[shard_idx] = load_columnar(osp.join(self.shard_dir, self.shard_files[shard_idx]))
+        return self._shards[shard_idx]
+
+    def __len__(self) -> int:
+        return int(self.shard_ptr[-1])
+
+    def __getitem__(self, index: Union[int, np.integer, Tensor, slice]) -> Union[Data, PackedTaskStore]:
+        if isinstance(index, slice):
+            return self.select(np.arange(*index.indices(len(self))))
+        index = int(index)
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError(f"index {index} is out of range for ShardedTaskStore with length {len(self)}")
+        shard_idx = int(np.searchsorted(self.shard_ptr, index, side="right")) - 1
+        return self.shard(shard_idx)[index - int(self.shard_ptr[shard_idx])]
+
+    def __iter__(self) -> Iterator[Data]:
+        for shard_idx in range(self.num_shards):
+            yield from self.shard(shard_idx)
+
+    def select(self, indexs: Union[list, np.ndarray, Tensor]) -> PackedTaskStore:
+        r"""Gather samples by a 1-d index array into an in-memory PackedTaskStore.
+        Args:
+            indexs (Union[list, np.ndarray, Tensor]): Index of samples to keep.
+        """
+        if isinstance(indexs, Tensor):
+            indexs = indexs.cpu().numpy()
+        indexs = np.asarray(indexs, dtype=np.int64).reshape(-1)
+        indexs = np.where(indexs < 0, indexs + len(self), indexs)
+        shard_idxs = np.searchsorted(self.shard_ptr, indexs, side="right") - 1
+        # Gather from each shard in a run of consecutive indexs in the same shard to keep the order of indexs.
+        boundary = np.flatnonzero(np.diff(shard_idxs)) + 1
+        stores = []
+        for run in np.split(np.arange(len(indexs)), boundary):
+            if len(run) == 0:
+                continue
+            shard_idx = int(shard_idxs[run[0]])
+            stores.append(self.shard(shard_idx).select(indexs[run] - self.shard_ptr[shard_idx]))
+        return PackedTaskStore.concat(stores)
+
+    def __getstate__(self) -> dict:
+        # Do not pickle memory-mapped shards, they are opened again when accessed.
+        state = self.__dict__.copy()
+        state["_shards"] = {}
+        return state
+
+
 def download_google_url(
         id: str,
         folder: str,